@@ -19,6 +19,28 @@ DB_NAME = os.getenv('DB_NAME')
 # postgresql://user:password@db:5432/uniswap_data
 DATABASE_URL = f'postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
 
+# Primary connection pool, shared by the API and every chain's ingest
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+# Log every SQL statement, expensive, prefer the slow query log below
+DB_ECHO = os.getenv('DB_ECHO', 'false').lower() == 'true'
+
+# Read replica configuration (optional)
+# Chart reads go to the replica when it is set, reachable and not lagging
+# more than DB_REPLICA_MAX_LAG_SECONDS, otherwise they fall back to the primary
+DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST')
+DB_REPLICA_PORT = os.getenv('DB_REPLICA_PORT', DB_PORT)
+DATABASE_REPLICA_URL = (
+    f'postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_REPLICA_HOST}:{DB_REPLICA_PORT}/{DB_NAME}'
+    if DB_REPLICA_HOST
+    else None
+)
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', '30'))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '10'))
+# Bound on connecting to the replica and on the lag check, so an
+# unreachable replica falls back to the primary instead of hanging requests
+DB_REPLICA_TIMEOUT_SECONDS = float(os.getenv('DB_REPLICA_TIMEOUT_SECONDS', '2'))
+
 # API keys
 GRAPH_API_KEY = os.getenv('GRAPH_API_KEY')
 
@@ -27,5 +49,106 @@ SUBGRAPH_ID = os.getenv('SUBGRAPH_ID')
 UNISWAP_SUBGRAPH_URL = f'https://gateway.thegraph.com/api/{GRAPH_API_KEY}/subgraphs/id/{SUBGRAPH_ID}'
 
 # Token addresses
-TOKEN_ADDRESSES = os.getenv('TOKEN_ADDRESSES').split(',')
-TOKEN_ADDRESS_ARRAY = [addr.strip() for addr in TOKEN_ADDRESSES if addr.strip()]    
\ No newline at end of file
+TOKEN_ADDRESSES = os.getenv('TOKEN_ADDRESSES', '').split(',')
+TOKEN_ADDRESS_ARRAY = [addr.strip().lower() for addr in TOKEN_ADDRESSES if addr.strip()]
+
+# Subgraph deployments, ingested concurrently with one pipeline per chain
+# SUBGRAPHS=mainnet:<subgraph id>,arbitrum:<subgraph id>,base:<subgraph id>
+# Without SUBGRAPHS the single SUBGRAPH_ID is tracked as DEFAULT_CHAIN.
+# TOKEN_ADDRESSES_<CHAIN> and SUBGRAPH_RATE_LIMIT_<CHAIN> override the
+# defaults per chain, TOKEN_ADDRESSES applies to DEFAULT_CHAIN
+DEFAULT_CHAIN = os.getenv('DEFAULT_CHAIN', 'mainnet')
+# Requests per second and open connections per subgraph
+SUBGRAPH_RATE_LIMIT = float(os.getenv('SUBGRAPH_RATE_LIMIT', '5'))
+SUBGRAPH_CONNECTIONS = int(os.getenv('SUBGRAPH_CONNECTIONS', '10'))
+SUBGRAPHS = os.getenv('SUBGRAPHS', f'{DEFAULT_CHAIN}:{SUBGRAPH_ID}')
+
+
+def parse_subgraph_endpoints(subgraphs):
+    endpoints = {}
+    for entry in subgraphs.split(','):
+        if not entry.strip():
+            continue
+        chain, _, subgraph_id = (part.strip() for part in entry.partition(':'))
+        if not chain or not subgraph_id:
+            raise ValueError(
+                f'Invalid SUBGRAPHS entry {entry.strip()!r}, '
+                'expected <chain>:<subgraph id>[,<chain>:<subgraph id>...]'
+            )
+        addresses = os.getenv(f'TOKEN_ADDRESSES_{chain.upper()}')
+        if addresses is not None:
+            token_addresses = [addr.strip().lower() for addr in addresses.split(',') if addr.strip()]
+        else:
+            token_addresses = TOKEN_ADDRESS_ARRAY if chain == DEFAULT_CHAIN else []
+        endpoints[chain] = {
+            'url': f'https://gateway.thegraph.com/api/{GRAPH_API_KEY}/subgraphs/id/{subgraph_id}',
+            'token_addresses': token_addresses,
+            'rate_limit': float(os.getenv(f'SUBGRAPH_RATE_LIMIT_{chain.upper()}', SUBGRAPH_RATE_LIMIT)),
+        }
+    return endpoints
+
+
+SUBGRAPH_ENDPOINTS = parse_subgraph_endpoints(SUBGRAPHS)
+
+# Token discovery
+# Track the top N subgraph tokens ranked by volumeUSD, 0 disables discovery
+# and only the TOKEN_ADDRESSES list is tracked
+TOKEN_DISCOVERY_TOP_N = int(os.getenv('TOKEN_DISCOVERY_TOP_N', '0'))
+TOKEN_DISCOVERY_INTERVAL = int(os.getenv('TOKEN_DISCOVERY_INTERVAL', '3600'))
+
+# Seconds between token metadata (totalSupply, volumeUSD) refreshes,
+# independent of the price polling interval
+TOKEN_METADATA_INTERVAL = int(os.getenv('TOKEN_METADATA_INTERVAL', '3600'))
+
+# The Graph caps the number of records returned per query at 1000
+SUBGRAPH_PAGE_SIZE = int(os.getenv('SUBGRAPH_PAGE_SIZE', '1000'))
+
+# Ingest pipeline
+# Concurrent subgraph fetchers, pages buffered between the fetch and write
+# stages, rows coalesced per write transaction and concurrent writers
+INGEST_FETCH_CONCURRENCY = int(os.getenv('INGEST_FETCH_CONCURRENCY', '8'))
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', '64'))
+INGEST_WRITE_BATCH_ROWS = int(os.getenv('INGEST_WRITE_BATCH_ROWS', '5000'))
+INGEST_WRITERS = int(os.getenv('INGEST_WRITERS', '2'))
+# Attempts per failed write batch before its tokens are refetched next cycle
+INGEST_WRITE_RETRIES = int(os.getenv('INGEST_WRITE_RETRIES', '2'))
+
+# Indicators
+# Hours of closes kept per cached indicator series, and the number of
+# (token, indicator, params) series kept in memory
+INDICATOR_LOOKBACK_HOURS = int(os.getenv('INDICATOR_LOOKBACK_HOURS', '2160'))
+INDICATOR_CACHE_SIZE = int(os.getenv('INDICATOR_CACHE_SIZE', '1024'))
+
+# Correlations
+# Longest window accepted by the correlations route
+CORRELATION_MAX_HOURS = int(os.getenv('CORRELATION_MAX_HOURS', '8760'))
+
+# Query profiling
+# Statements slower than SLOW_QUERY_THRESHOLD_MS are logged and kept for the
+# debug routes, slow chart queries over EXPLAIN_THRESHOLD_MS get an
+# EXPLAIN (ANALYZE, BUFFERS) captured, at most once per cooldown
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '200'))
+SLOW_QUERY_LOG_SIZE = int(os.getenv('SLOW_QUERY_LOG_SIZE', '50'))
+EXPLAIN_THRESHOLD_MS = float(os.getenv('EXPLAIN_THRESHOLD_MS', '500'))
+EXPLAIN_COOLDOWN_SECONDS = float(os.getenv('EXPLAIN_COOLDOWN_SECONDS', '60'))
+
+# Request profiling
+# When enabled, requests sent with the PROFILE_HEADER header are profiled
+# with pyinstrument (or cProfile if it is not installed)
+REQUEST_PROFILING_ENABLED = os.getenv('REQUEST_PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILE_HEADER = os.getenv('PROFILE_HEADER', 'X-Profile')
+
+# Chart snapshots
+# When enabled, each polling cycle renders the standard chart windows
+# ("hours:interval_hours" pairs) for every token into CHART_SNAPSHOT_DIR,
+# the chart route serves those files without touching the database
+CHART_SNAPSHOTS_ENABLED = os.getenv('CHART_SNAPSHOTS_ENABLED', 'false').lower() == 'true'
+CHART_SNAPSHOT_DIR = os.getenv('CHART_SNAPSHOT_DIR', '/tmp/uniswap-chart-snapshots')
+CHART_SNAPSHOT_WINDOWS = [
+    tuple(int(part) for part in window.split(':'))
+    for window in os.getenv(
+        'CHART_SNAPSHOT_WINDOWS', '24:1,168:1,168:4,720:4,720:24'
+    ).split(',')
+    if window.strip()
+]
+CHART_SNAPSHOT_CONCURRENCY = int(os.getenv('CHART_SNAPSHOT_CONCURRENCY', '4'))
@@ -1,20 +1,35 @@
 import asyncio
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from services.database import close_db
-from routes import token
+from services.subgraph_client import close_subgraph_clients
+from services.request_profiler import request_profiler
+from routes import token, debug
 from scripts.reset_db import reset_database
+from config import TOKEN_METADATA_INTERVAL, REQUEST_PROFILING_ENABLED, PROFILE_HEADER
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup within reset_db.py
-    uniswap_service = await reset_database()
-    # Poll for new data every minute
-    asyncio.create_task(uniswap_service.start_polling())
+    uniswap_services = await reset_database()
+    # The event loop only keeps weak references to tasks
+    polling_tasks = []
+    for uniswap_service in uniswap_services:
+        # Poll every chain for new data concurrently
+        polling_tasks.append(asyncio.create_task(uniswap_service.start_polling()))
+        # Refresh token metadata on its own, slower cadence
+        polling_tasks.append(
+            asyncio.create_task(
+                uniswap_service.start_metadata_polling(TOKEN_METADATA_INTERVAL)
+            )
+        )
     yield
     # Shutdown
+    for task in polling_tasks:
+        task.cancel()
+    await close_subgraph_clients()
     await close_db()
 
 
@@ -29,8 +44,21 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Opt-in per request profiling, triggered by a header. Only registered when
+# enabled, the http middleware adds a task and re-streams every response
+if REQUEST_PROFILING_ENABLED:
+
+    @app.middleware("http")
+    async def profile_requests(request: Request, call_next):
+        if request.headers.get(PROFILE_HEADER):
+            return await request_profiler.profile(request, call_next)
+        return await call_next(request)
+
+
 # Router for tokens data
 app.include_router(token.router, prefix="/api", tags=["tokens"])
+# Router for operational stats
+app.include_router(debug.router, prefix="/api/debug", tags=["debug"])
 
 
 @app.get("/")
@@ -0,0 +1,44 @@
+from sqlalchemy import (
+    Column,
+    Integer,
+    DateTime,
+    ForeignKey,
+    UniqueConstraint,
+    func,
+)
+from services.database import Base
+
+
+"""
+    A note about the BackfillCheckpoint model:
+    Each row records one completed (token, time window) of a historical
+    backfill. The row is committed in the same transaction as the window's
+    price data, so a window is either fully written and checkpointed or not
+    at all, and an interrupted backfill resumes from the missing windows.
+"""
+
+
+class BackfillCheckpoint(Base):
+    __tablename__ = "backfill_checkpoints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    token_id = Column(Integer, ForeignKey("tokens.id"), nullable=False)
+    window_start = Column(DateTime(timezone=True), nullable=False)
+    window_end = Column(DateTime(timezone=True), nullable=False)
+    row_count = Column(Integer, nullable=False)
+    completed_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    __table_args__ = (
+        UniqueConstraint(
+            "token_id", "window_start", "window_end", name="uix_token_window"
+        ),
+    )
+
+    def __repr__(self):
+        return (
+            f"<BackfillCheckpoint(token_id='{self.token_id}', "
+            f"window_start='{self.window_start}', "
+            f"window_end='{self.window_end}')>"
+        )
@@ -1,21 +1,37 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Boolean, Column, Integer, String, UniqueConstraint, true
 from sqlalchemy.orm import relationship
 from services.database import Base
+from config import DEFAULT_CHAIN
 
 
 class Token(Base):
     __tablename__ = "tokens"
 
     id = Column(Integer, primary_key=True, index=True)
-    address = Column(String(42), unique=True, index=True, nullable=False)
-    symbol = Column(String(10), unique=True, index=True, nullable=False)
+    # Subgraph deployment the token was ingested from, e.g. mainnet
+    chain = Column(
+        String(32), nullable=False, default=DEFAULT_CHAIN, server_default=DEFAULT_CHAIN
+    )
+    address = Column(String(42), index=True, nullable=False)
+    symbol = Column(String(10), index=True, nullable=False)
     name = Column(String(100), nullable=False)
     decimals = Column(Integer, nullable=False)
     total_supply = Column(String)
     volume_usd = Column(String)
+    # Tokens that fall out of the discovered universe are retired rather than
+    # deleted, so their price history remains queryable
+    active = Column(Boolean, nullable=False, default=True, server_default=true())
+
+    # Addresses and symbols are only unique within a chain
+    __table_args__ = (
+        UniqueConstraint("chain", "address", name="uix_token_chain_address"),
+        UniqueConstraint("chain", "symbol", name="uix_token_chain_symbol"),
+    )
 
     # relationship with PriceData for the index
     price_data = relationship("PriceData", back_populates="token")
 
     def __repr__(self):
-        return f"<Token(symbol='{self.symbol}', name='{self.name}')>"
+        return (
+            f"<Token(chain='{self.chain}', symbol='{self.symbol}', name='{self.name}')>"
+        )
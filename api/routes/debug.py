@@ -0,0 +1,63 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from services.database import pool_stats
+from services.ingest_pipeline import pipeline_stats
+from services.indicators import indicator_cache
+from services.subgraph_client import subgraph_stats
+from services.query_profiler import query_profiler
+from services.request_profiler import request_profiler
+from routes.token import chart_data_flight, chart_data_all_flight
+
+router = APIRouter()
+
+
+@router.get("/db-pool-stats")
+async def get_db_pool_stats():
+    # Connection pool usage for the primary and, if configured, the replica
+    return pool_stats()
+
+
+@router.get("/ingest-stats")
+async def get_ingest_stats():
+    # Queue depth and per stage throughput of the current or last ingest run
+    return pipeline_stats()
+
+
+@router.get("/indicator-cache-stats")
+async def get_indicator_cache_stats():
+    return indicator_cache.stats()
+
+
+@router.get("/coalescing-stats")
+async def get_coalescing_stats():
+    # Requests served from another request's in-flight query
+    return {
+        flight.name: flight.stats()
+        for flight in (chart_data_flight, chart_data_all_flight)
+    }
+
+
+@router.get("/subgraph-stats")
+async def get_subgraph_stats():
+    # Requests, errors and limits per subgraph deployment
+    return subgraph_stats()
+
+
+@router.get("/queries")
+async def get_query_stats():
+    # Statement counts, slow query log and captured EXPLAIN plans
+    return query_profiler.stats()
+
+
+@router.get("/profiles")
+async def get_profiles():
+    # Requests profiled through the profiling header, newest last
+    return request_profiler.summaries()
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: int):
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile["report"]
@@ -1,20 +1,31 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException, Query
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import joinedload
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text
-from typing import List, Optional
+from sqlalchemy import and_, select, text, func, Float, BigInteger
+from typing import List, Literal, Optional
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from pydantic import BaseModel
 from models.token import Token
 from models.chart_data import PriceData
-from services.database import get_db
+from services.database import get_db, get_read_db, read_session
+from services.indicators import indicator_cache, make_indicator
+from services.correlations import close_matrix, return_statistics, correlation_cache
+from services.chart_snapshots import snapshot_reader
+from config import DEFAULT_CHAIN, INDICATOR_LOOKBACK_HOURS, CORRELATION_MAX_HOURS
 from utils.format_prices import format_float
+from utils.downsample import DOWNSAMPLERS, fill_gaps
+from utils.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Request coalescing for the chart routes
+chart_data_flight = SingleFlight("chart-data")
+chart_data_all_flight = SingleFlight("chart-data-all")
+
 
 class PriceDataResponse(BaseModel):
     timestamp: datetime
@@ -35,10 +46,73 @@ class TokenDataResponse(BaseModel):
     price_data: List[PriceDataResponse]
 
 
+def token_filter(chain, symbol):
+    # Routes take a symbol or a token address. Retired tokens whose symbol
+    # was taken by a newly discovered token are renamed to their address
+    # prefix, the full address finds them either way
+    if symbol.startswith("0x") and len(symbol) == 42:
+        return and_(Token.chain == chain, Token.address == symbol.lower())
+    return and_(Token.chain == chain, Token.symbol == symbol)
+
+
+def format_chart_rows(price_data):
+    # 5 lists for open, close, high, low, priceUSD
+    data = [[] for _ in range(5)]
+
+    for entry in price_data:
+        # Return timestamp without UTC designation
+        timestamp = entry.interval_timestamp.replace(tzinfo=None).isoformat()
+        data[0].append([timestamp, "open", format_float(entry.open)])
+        data[1].append([timestamp, "close", format_float(entry.close)])
+        data[2].append([timestamp, "high", format_float(entry.high)])
+        data[3].append([timestamp, "low", format_float(entry.low)])
+        data[4].append([timestamp, "priceUSD", format_float(entry.price_usd)])
+
+    return data
+
+
+def downsample_chart_data(price_data, max_points, method):
+    """
+    Keep at most max_points rows, chosen on the priceUSD series, and return
+    all 5 series for the same rows so every timestamp keeps its full candle.
+    Null values are returned as None, as they are without downsampling.
+    """
+    x = np.array([entry.interval_timestamp.timestamp() for entry in price_data])
+    y = np.array(
+        [
+            np.nan if entry.price_usd is None else entry.price_usd
+            for entry in price_data
+        ],
+        dtype=np.float64,
+    )
+    keep = DOWNSAMPLERS[method](x, fill_gaps(y), max_points)
+    return format_chart_rows([price_data[i] for i in keep])
+
+
 @router.get("/tokens", response_model=List[dict])
-async def read_tokens(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Token))
+async def read_tokens(
+    chain: str = Query(DEFAULT_CHAIN, description="Subgraph deployment, e.g. mainnet"),
+    include_retired: bool = Query(
+        False, description="Also list retired tokens, which keep their history"
+    ),
+    db: AsyncSession = Depends(get_read_db),
+):
+    # Retired tokens keep their price history but are only listed on request
+    query = select(Token).filter(Token.chain == chain)
+    if not include_retired:
+        query = query.filter(Token.active.is_(True))
+    result = await db.execute(query)
     tokens = result.scalars().all()
+    if include_retired:
+        return [
+            {
+                "symbol": token.symbol,
+                "name": token.name,
+                "address": token.address,
+                "active": token.active,
+            }
+            for token in tokens
+        ]
     return [
         {"symbol": token.symbol, "name": token.name, "address": token.address}
         for token in tokens
@@ -56,8 +130,14 @@ async def read_tokens(db: AsyncSession = Depends(get_db)):
         symbol (str): The symbol of the token to retrieve data for.
         hours (int): The number of hours of historical data to retrieve.
         interval_hours (int, optional): The interval in hours for data 
-        aggregation. Defaults to 1. db (AsyncSession): The database session, 
-        provided by FastAPI's dependency injection.
+        aggregation. Defaults to 1.
+        max_points (int, optional): Upper bound on the points returned per 
+        series. Longer series are downsampled server-side. Defaults to None, 
+        no downsampling.
+        downsample (str, optional): "lttb" (Largest-Triangle-Three-Buckets) 
+        or "minmax" (min and max per bucket). Defaults to "lttb".
+        chain (str, optional): The subgraph deployment the token belongs to. 
+        Defaults to DEFAULT_CHAIN.
 
     Raises:
         HTTPException: 
@@ -86,10 +166,44 @@ async def get_chart_data(
     symbol: str,
     hours: int,
     interval_hours: int = 1,
-    db: AsyncSession = Depends(get_db)
+    max_points: Optional[int] = Query(
+        None, ge=3, description="Maximum number of points per series"
+    ),
+    downsample: Literal["lttb", "minmax"] = "lttb",
+    chain: str = Query(DEFAULT_CHAIN, description="Subgraph deployment, e.g. mainnet"),
+):
+    # Standard windows are served from the precomputed snapshot if present
+    if max_points is None:
+        snapshot = snapshot_reader.read(chain, symbol, hours, interval_hours)
+        if snapshot is not None:
+            return Response(content=snapshot, media_type="application/json")
+
+    # Concurrent identical requests share one in-flight query, the shared
+    # query runs on its own session so no single request owns it
+    async def run_query():
+        async with read_session() as db:
+            return await query_chart_data(
+                db, symbol, hours, interval_hours, max_points, downsample, chain
+            )
+
+    return await chart_data_flight.do(
+        (chain, symbol, hours, interval_hours, max_points, downsample), run_query
+    )
+
+
+async def query_chart_data(
+    db,
+    symbol,
+    hours,
+    interval_hours=1,
+    max_points=None,
+    downsample="lttb",
+    chain=DEFAULT_CHAIN,
 ):
     # Get the token record by symbol
-    token_result = await db.execute(select(Token).filter(Token.symbol == symbol))
+    token_result = await db.execute(
+        select(Token).filter(token_filter(chain, symbol))
+    )
     token = token_result.scalar_one_or_none()
     if not token:
         raise HTTPException(status_code=404, detail="Token not found")
@@ -152,38 +266,192 @@ async def get_chart_data(
     )
     price_data = result.fetchall()
 
+    # Bound the response size whatever the window length
+    if max_points is not None and len(price_data) > max_points:
+        return downsample_chart_data(price_data, max_points, downsample)
+
     # Structure the data with the specified interval
-    # 5 lists for open, close, high, low, priceUSD
-    data = [[] for _ in range(5)]
+    return format_chart_rows(price_data)
 
-    for entry in price_data:
-        # Return timestamp without UTC designation
-        timestamp = entry.interval_timestamp.replace(tzinfo=None).isoformat()
-        data[0].append([timestamp, "open", format_float(entry.open)])
-        data[1].append([timestamp, "close", format_float(entry.close)])
-        data[2].append([timestamp, "high", format_float(entry.high)])
-        data[3].append([timestamp, "low", format_float(entry.low)])
-        data[4].append([timestamp, "priceUSD", format_float(entry.price_usd)])
 
-    return data
+    """
+    Retrieve a technical indicator over a token's hourly close series.
+
+    Indicators are computed once per (token, indicator, params) with 
+    vectorized NumPy over the last INDICATOR_LOOKBACK_HOURS of closes and 
+    cached. New candles from the ingest pipeline are applied to the cached 
+    series incrementally.
+
+    Parameters:
+        symbol (str): The symbol of the token.
+        indicator (str): One of sma, ema, rsi, bollinger or volatility 
+        (rolling standard deviation of hourly log returns).
+        hours (int): The number of hours of indicator values to return.
+        period (int): The indicator window in hours. Defaults to 20.
+        num_std (float): Band width in standard deviations, bollinger only.
+        Defaults to 2.
+        chain (str): The subgraph deployment. Defaults to DEFAULT_CHAIN.
+
+    Returns:
+        List[List[List[Union[str, float, None]]]]: One list per indicator 
+        output (bollinger returns bb_middle, bb_upper and bb_lower), each 
+        data point is [timestamp, label, value]. Values are None until the 
+        indicator has a full window.
+    """
+@router.get("/indicators/{symbol}")
+async def get_indicators(
+    symbol: str,
+    indicator: Literal["sma", "ema", "rsi", "bollinger", "volatility"],
+    hours: int = Query(168, ge=1, le=INDICATOR_LOOKBACK_HOURS),
+    period: int = Query(20, ge=2, le=500),
+    num_std: float = Query(2.0, gt=0),
+    chain: str = Query(DEFAULT_CHAIN, description="Subgraph deployment, e.g. mainnet"),
+    # Cached series are kept current from primary commits, so they are
+    # built from the primary as well, replica lag would leave gaps
+    db: AsyncSession = Depends(get_db),
+):
+    token_result = await db.execute(
+        select(Token).filter(token_filter(chain, symbol))
+    )
+    token = token_result.scalar_one_or_none()
+    if not token:
+        raise HTTPException(status_code=404, detail="Token not found")
+
+    series = await indicator_cache.get(
+        db, token.id, make_indicator(indicator, period, num_std)
+    )
+    since = datetime.now(ZoneInfo("UTC")).replace(
+        minute=0, second=0, microsecond=0
+    ) - timedelta(hours=hours)
+    return series.to_chart_data(since.timestamp())
+
+
+    """
+    Correlation and covariance matrices of hourly log returns across tokens.
+
+    Aligned closes for every requested token are read with one query, laid 
+    out as an (hour x token) matrix with forward-filled gaps, and all pairs 
+    are computed in one vectorized pass. Each pair uses the hours where both 
+    tokens have a return. Results are cached until the next ingest cycle 
+    commits.
+
+    Parameters:
+        hours (int): The number of hours of returns. Defaults to 720.
+        symbols (str, optional): Comma separated symbols. Defaults to all 
+        tracked tokens.
+        chain (str): The subgraph deployment the tokens belong to. Defaults 
+        to DEFAULT_CHAIN.
+
+    Returns:
+        dict: symbols in matrix order, the window start and end, and the 
+        correlation, covariance and observations (returns per pair) 
+        matrices. Pairs without two common returns are None.
+    """
+@router.get("/correlations")
+async def get_correlations(
+    hours: int = Query(720, ge=2, le=CORRELATION_MAX_HOURS),
+    symbols: Optional[str] = Query(
+        None, description="Comma separated symbols, defaults to all tracked tokens"
+    ),
+    chain: str = Query(DEFAULT_CHAIN, description="Subgraph deployment, e.g. mainnet"),
+    # Results are cached until the next primary commit, so they are built
+    # from the primary, a lagging replica's matrix would be cached stale
+    db: AsyncSession = Depends(get_db),
+):
+    end_time = datetime.now(ZoneInfo("UTC")).replace(minute=0, second=0, microsecond=0)
+    start_time = end_time - timedelta(hours=hours)
+    symbol_list = (
+        sorted({s.strip() for s in symbols.split(",") if s.strip()}) if symbols else None
+    )
+
+    cache_key = (chain, end_time, hours, tuple(symbol_list) if symbol_list else None)
+    cached = correlation_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    token_query = (
+        select(Token.id, Token.symbol)
+        .filter(Token.chain == chain)
+        .order_by(Token.symbol)
+    )
+    if symbol_list:
+        token_query = token_query.filter(Token.symbol.in_(symbol_list))
+    else:
+        token_query = token_query.filter(Token.active.is_(True))
+    tokens = (await db.execute(token_query)).all()
+    if not tokens:
+        raise HTTPException(status_code=404, detail="Token not found")
+    token_index = {token.id: i for i, token in enumerate(tokens)}
+
+    # One set-based read of every close in the window, already numeric
+    # so the rows go straight into a NumPy array
+    hour = func.date_trunc("hour", PriceData.timestamp)
+    result = await db.execute(
+        select(
+            PriceData.token_id,
+            func.extract("epoch", hour).cast(BigInteger),
+            PriceData.close.cast(Float),
+        )
+        .filter(
+            PriceData.token_id.in_(list(token_index)),
+            PriceData.timestamp >= start_time,
+            PriceData.timestamp <= end_time,
+        )
+        .order_by(PriceData.timestamp)
+    )
+    rows = np.array(result.all(), dtype=np.float64).reshape(-1, 3)
+
+    n_hours = hours + 1
+    # Map token ids to matrix columns with a lookup array
+    column_lookup = np.zeros(max(token_index) + 1, dtype=np.intp)
+    column_lookup[list(token_index)] = list(token_index.values())
+    columns = column_lookup[rows[:, 0].astype(np.intp)]
+    hour_index = ((rows[:, 1] - start_time.timestamp()) // 3600).astype(np.intp)
+    closes = close_matrix(hour_index, columns, rows[:, 2], n_hours, len(tokens))
+    covariance, correlation, counts = return_statistics(closes)
+
+    def to_list(matrix):
+        return [
+            [None if np.isnan(value) else float(value) for value in row]
+            for row in matrix
+        ]
+
+    response = {
+        "symbols": [token.symbol for token in tokens],
+        "start": start_time.replace(tzinfo=None).isoformat(),
+        "end": end_time.replace(tzinfo=None).isoformat(),
+        "correlation": to_list(correlation),
+        "covariance": to_list(covariance),
+        "observations": counts.astype(int).tolist(),
+    }
+    correlation_cache.set(cache_key, response)
+    return response
 
 
 @router.get("/chart-data-all/{symbol}", response_model=TokenDataResponse)
 async def get_all_chart_data(
     symbol: str,
     limit: Optional[int] = Query(100, description="Number of records to return"),
-    db: AsyncSession = Depends(get_db),
+    chain: str = Query(DEFAULT_CHAIN, description="Subgraph deployment, e.g. mainnet"),
 ):
+    async def run_query():
+        async with read_session() as db:
+            return await query_all_chart_data(db, symbol, limit, chain)
+
+    return await chart_data_all_flight.do((chain, symbol, limit), run_query)
+
+
+async def query_all_chart_data(db, symbol, limit, chain=DEFAULT_CHAIN):
     logger.info(f"Fetching chart data for symbol: {symbol}, limit: {limit}")
     try:
         # Get the token record by symbol, including the associated price data
         query = (
             select(Token)
             .options(joinedload(Token.price_data))
-            .filter(Token.symbol == symbol)
+            .filter(token_filter(chain, symbol))
         )
         result = await db.execute(query)
-        token = await result.unique().scalar_one_or_none()
+        token = result.unique().scalar_one_or_none()
 
         if not token:
             logger.warning(f"Token not found for symbol: {symbol}")
@@ -231,11 +499,12 @@ async def get_all_chart_data(
 async def debug_price_data(
     symbol: str,
     limit: int = Query(10, description="Number of records to return"),
-    db: AsyncSession = Depends(get_db),
+    chain: str = Query(DEFAULT_CHAIN, description="Subgraph deployment, e.g. mainnet"),
+    db: AsyncSession = Depends(get_read_db),
 ):
     try:
         # First, get the token
-        token_query = select(Token).filter(Token.symbol == symbol)
+        token_query = select(Token).filter(token_filter(chain, symbol))
         token_result = await db.execute(token_query)
         token = await token_result.scalar_one_or_none()
 
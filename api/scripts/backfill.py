@@ -0,0 +1,94 @@
+import sys
+import os
+
+# This is called from docker compose,
+# and doesn't have the parent directory in the path
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# pylint: disable=wrong-import-position
+import argparse
+import logging
+import asyncio
+from datetime import datetime, timezone
+from services.database import create_db, close_db
+from services.backfill import BackfillService
+from services.subgraph_client import close_subgraph_clients
+
+
+"""
+    Resumable historical backfill.
+
+    Example, a year of hourly data for every tracked token:
+        python scripts/backfill.py --start 2023-01-01 --end 2024-01-01
+
+    Completed windows are checkpointed in the backfill_checkpoints table.
+    Rerunning the same command after an interruption only fetches the
+    windows that were not completed. Keep --window-hours the same between
+    runs, checkpoints are keyed by the window bounds.
+"""
+
+
+def parse_date(value):
+    # Dates without a timezone are interpreted as UTC
+    date = datetime.fromisoformat(value)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Backfill hourly price data")
+    parser.add_argument("--start", type=parse_date, required=True)
+    # Hour aligned so reruns produce the same final window
+    parser.add_argument(
+        "--end",
+        type=parse_date,
+        default=datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0),
+    )
+    parser.add_argument(
+        "--symbols",
+        type=lambda value: [s.strip() for s in value.split(",") if s.strip()],
+        help="Comma separated symbols, defaults to all tracked tokens",
+    )
+    parser.add_argument(
+        "--chain",
+        help="Only backfill tokens of this chain, defaults to every chain",
+    )
+    parser.add_argument(
+        "--window-hours",
+        type=int,
+        default=168,
+        help="Hours per window, a week of hourly data fits in one subgraph page",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum windows fetched and written at once",
+    )
+    return parser.parse_args()
+
+
+async def backfill(args):
+    logging.basicConfig(level=logging.INFO)
+    # The checkpoint table may not exist on databases created before it
+    await create_db()
+    try:
+        backfill_service = BackfillService(
+            concurrency=args.concurrency, window_hours=args.window_hours
+        )
+        summary = await backfill_service.run(
+            args.start, args.end, args.symbols, args.chain
+        )
+    finally:
+        await close_subgraph_clients()
+        await close_db()
+    return summary
+
+
+if __name__ == "__main__":
+    summary = asyncio.run(backfill(parse_args()))
+    # Non-zero exit so a wrapper can rerun until every window is complete
+    sys.exit(1 if summary["failed"] else 0)
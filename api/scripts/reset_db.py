@@ -12,7 +12,26 @@ import logging
 import asyncio
 from services.database import init_db, get_db
 from services.uniswap_subgraph import UniswapSubgraphService
-from config import TOKEN_ADDRESS_ARRAY
+from services.subgraph_client import close_subgraph_clients
+from models.backfill_checkpoint import BackfillCheckpoint  # noqa: F401, registers the table for init_db
+from config import SUBGRAPH_ENDPOINTS, TOKEN_DISCOVERY_TOP_N
+
+
+async def seed_chain(chain):
+    # Each chain gets its own service and database session
+    db = await anext(get_db())
+    uniswap_service = UniswapSubgraphService(db, chain)
+    # Seed the database with historical data
+    if TOKEN_DISCOVERY_TOP_N:
+        # Track the top tokens by volume, plus the configured addresses
+        await uniswap_service.discover_tokens(
+            TOKEN_DISCOVERY_TOP_N, uniswap_service.token_addresses
+        )
+        await uniswap_service.update_chart_data()
+    else:
+        await uniswap_service.fetch_and_store_data(uniswap_service.token_addresses)
+    logging.info("Seeded %s", chain)
+    return uniswap_service
 
 
 async def reset_database():
@@ -20,14 +39,26 @@ async def reset_database():
     # Initialize the database
     logging.info(":::::::Initializing database:::::::")
     await init_db()
-    db = await anext(get_db())
-    # Initialize Uniswap subgraph service
-    uniswap_service = UniswapSubgraphService(db)
-    # Seed the database with historical data
-    await uniswap_service.fetch_and_store_data(TOKEN_ADDRESS_ARRAY)
+    # Seed every configured subgraph concurrently, a chain that fails to
+    # seed is logged and left out without affecting the others
+    chains = list(SUBGRAPH_ENDPOINTS)
+    results = await asyncio.gather(
+        *(seed_chain(chain) for chain in chains), return_exceptions=True
+    )
+    uniswap_services = []
+    for chain, result in zip(chains, results):
+        if isinstance(result, Exception):
+            logging.error("Seeding %s failed, it will not be polled: %s", chain, result)
+        else:
+            uniswap_services.append(result)
     logging.info("Database has been reset and initialized with data.")
-    return uniswap_service
+    return uniswap_services
+
+
+async def main():
+    await reset_database()
+    await close_subgraph_clients()
 
 
 if __name__ == "__main__":
-    asyncio.run(reset_database())
+    asyncio.run(main())
@@ -0,0 +1,157 @@
+import logging
+import asyncio
+from datetime import timedelta
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models.token import Token
+from models.backfill_checkpoint import BackfillCheckpoint
+from services.database import AsyncSessionLocal
+from services.uniswap_subgraph import UniswapSubgraphService
+
+
+def build_windows(start_time, end_time, window_hours):
+    # Split [start_time, end_time) into consecutive windows, hour aligned
+    # so that the same range always yields the same checkpoint keys
+    step = timedelta(hours=window_hours)
+    window_start = start_time.replace(minute=0, second=0, microsecond=0)
+    windows = []
+    while window_start < end_time:
+        window_end = min(window_start + step, end_time)
+        windows.append((window_start, window_end))
+        window_start = window_end
+    return windows
+
+
+class BackfillService:
+    """
+    Backfill historical hourly price data for many tokens.
+
+    The requested range is split into windows per token and the windows are
+    fetched in parallel under a global concurrency limit. Every window is
+    written together with its checkpoint row in one transaction, and windows
+    that already have a checkpoint are skipped, so rerunning an interrupted
+    backfill with the same range and window size resumes where it stopped.
+    """
+
+    def __init__(self, concurrency=8, window_hours=168):
+        self.concurrency = concurrency
+        self.window_hours = window_hours
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def get_tokens(self, symbols=None, chain=None):
+        async with AsyncSessionLocal() as session:
+            query = select(Token)
+            if chain:
+                query = query.filter_by(chain=chain)
+            if symbols:
+                query = query.filter(Token.symbol.in_(symbols))
+            else:
+                query = query.filter_by(active=True)
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    async def get_completed_windows(self, token_ids, start_time, end_time):
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(
+                    BackfillCheckpoint.token_id,
+                    BackfillCheckpoint.window_start,
+                    BackfillCheckpoint.window_end,
+                ).filter(
+                    BackfillCheckpoint.token_id.in_(token_ids),
+                    BackfillCheckpoint.window_start >= start_time,
+                    BackfillCheckpoint.window_end <= end_time,
+                )
+            )
+            return {
+                (row.token_id, row.window_start, row.window_end) for row in result
+            }
+
+    async def backfill_window(self, token, window_start, window_end):
+        async with self.semaphore:
+            # Sessions are not safe for concurrent use, one per window
+            async with AsyncSessionLocal() as session:
+                uniswap_service = UniswapSubgraphService(session, token.chain)
+                price_data = await uniswap_service.fetch_price_data(
+                    token.address,
+                    int(window_start.timestamp()),
+                    int(window_end.timestamp()),
+                )
+                await uniswap_service.upsert_price_data(token.id, price_data)
+                await session.execute(
+                    pg_insert(BackfillCheckpoint)
+                    .values(
+                        token_id=token.id,
+                        window_start=window_start,
+                        window_end=window_end,
+                        row_count=len(price_data),
+                    )
+                    .on_conflict_do_nothing(constraint="uix_token_window")
+                )
+                # Price data and checkpoint are committed together
+                await session.commit()
+
+        logging.debug(
+            "Backfilled %s rows for %s from %s to %s",
+            len(price_data),
+            token.symbol,
+            window_start,
+            window_end,
+        )
+        return len(price_data)
+
+    async def run(self, start_time, end_time, symbols=None, chain=None):
+        tokens = await self.get_tokens(symbols, chain)
+        if not tokens:
+            logging.warning("No tokens to backfill")
+            return {"completed": 0, "skipped": 0, "failed": 0, "rows": 0}
+
+        windows = build_windows(start_time, end_time, self.window_hours)
+        if not windows:
+            logging.warning("Empty backfill range %s to %s", start_time, end_time)
+            return {"completed": 0, "skipped": 0, "failed": 0, "rows": 0}
+        completed = await self.get_completed_windows(
+            [token.id for token in tokens], windows[0][0], windows[-1][1]
+        )
+        pending = [
+            (token, window_start, window_end)
+            for token in tokens
+            for window_start, window_end in windows
+            if (token.id, window_start, window_end) not in completed
+        ]
+        skipped = len(tokens) * len(windows) - len(pending)
+        logging.info(
+            "Backfilling %s windows for %s tokens (%s already checkpointed) "
+            "with concurrency %s",
+            len(pending),
+            len(tokens),
+            skipped,
+            self.concurrency,
+        )
+
+        results = await asyncio.gather(
+            *(self.backfill_window(*window) for window in pending),
+            return_exceptions=True,
+        )
+
+        failed = 0
+        for (token, window_start, window_end), result in zip(pending, results):
+            if isinstance(result, Exception):
+                failed += 1
+                logging.error(
+                    "Backfill failed for %s from %s to %s: %s",
+                    token.symbol,
+                    window_start,
+                    window_end,
+                    result,
+                )
+
+        summary = {
+            "completed": len(pending) - failed,
+            "skipped": skipped,
+            "failed": failed,
+            "rows": sum(r for r in results if not isinstance(r, Exception)),
+        }
+        logging.info("Backfill finished: %s", summary)
+        return summary
+
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import quote
+from zoneinfo import ZoneInfo
+from sqlalchemy import select
+from models.token import Token
+from services.database import AsyncSessionLocal
+from config import (
+    SUBGRAPH_ENDPOINTS,
+    CHART_SNAPSHOTS_ENABLED,
+    CHART_SNAPSHOT_DIR,
+    CHART_SNAPSHOT_WINDOWS,
+    CHART_SNAPSHOT_CONCURRENCY,
+)
+
+
+"""
+    Precomputed chart snapshots.
+
+    After each polling cycle the standard chart windows are rendered for
+    every active token and written to disk as the exact JSON body the
+    chart route would return. Files live under
+    CHART_SNAPSHOT_DIR/{chain}/{end hour}/, so a snapshot is only served
+    for the hour it was rendered in and older hours are pruned.
+
+    Files are replaced atomically and read through mmap, so every API
+    worker shares the page cache copy and a restarted worker serves them
+    straight away.
+"""
+
+
+# Mapped snapshots kept open per worker, each one holds a file descriptor
+SNAPSHOT_MAP_CACHE_SIZE = 512
+
+
+def snapshot_hour():
+    # Chart windows end on the current UTC hour
+    now = datetime.now(ZoneInfo("UTC")).replace(minute=0, second=0, microsecond=0)
+    return int(now.timestamp())
+
+
+def chain_dir(chain):
+    return os.path.join(CHART_SNAPSHOT_DIR, quote(chain, safe=""))
+
+
+def snapshot_path(chain, symbol, hours, interval_hours, hour):
+    return os.path.join(
+        chain_dir(chain),
+        str(hour),
+        f"{quote(symbol, safe='')}_{hours}_{interval_hours}.json",
+    )
+
+
+def serialize_chart_data(data):
+    # Same encoding as FastAPI's JSONResponse, so snapshots and live
+    # responses are byte for byte identical
+    return json.dumps(
+        data, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def write_atomic(path, payload):
+    """
+    Write payload to path via a temporary file in the same directory,
+    readers see either the previous snapshot or the new one.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def prune_snapshots(chain, hour):
+    # Snapshots from earlier hours are never served again
+    try:
+        entries = os.listdir(chain_dir(chain))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.isdigit() and int(entry) < hour:
+            shutil.rmtree(os.path.join(chain_dir(chain), entry), ignore_errors=True)
+
+
+async def write_token_snapshots(chain, symbol, hour):
+    # Imported here, the chart route imports this module for reads
+    from routes.token import query_chart_data
+
+    # Primary session, the rows were just written by this polling cycle
+    async with AsyncSessionLocal() as db:
+        for hours, interval_hours in CHART_SNAPSHOT_WINDOWS:
+            data = await query_chart_data(
+                db, symbol, hours, interval_hours, chain=chain
+            )
+            # The query's window ends on the hour it ran in, which is the
+            # snapshot hour only if the hour has not turned since the stage
+            # started, otherwise it would land in the previous hour's files
+            if snapshot_hour() != hour:
+                return False
+            await asyncio.to_thread(
+                write_atomic,
+                snapshot_path(chain, symbol, hours, interval_hours, hour),
+                serialize_chart_data(data),
+            )
+    return True
+
+
+async def write_chart_snapshots(chain):
+    """
+    Render the standard chart windows for every active token on a chain.
+    Failures are logged per token, the route falls back to the live query.
+    """
+    hour = snapshot_hour()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Token.symbol).filter(Token.chain == chain, Token.active.is_(True))
+        )
+        symbols = result.scalars().all()
+
+    semaphore = asyncio.Semaphore(CHART_SNAPSHOT_CONCURRENCY)
+
+    async def write_symbol(symbol):
+        async with semaphore:
+            try:
+                return await write_token_snapshots(chain, symbol, hour)
+            except Exception as e:
+                logging.error("%s chart snapshot for %s failed: %s", chain, symbol, e)
+                return False
+
+    written = await asyncio.gather(*(write_symbol(symbol) for symbol in symbols))
+    await asyncio.to_thread(prune_snapshots, chain, hour)
+    logging.info(
+        "Wrote %s chart snapshots for %s of %s tokens",
+        chain,
+        sum(written),
+        len(symbols),
+    )
+
+
+class SnapshotReader:
+    """
+    Serves snapshot files as memoryviews over read-only mmaps, remapping
+    a file when it has been replaced since it was mapped.
+    """
+
+    def __init__(self, max_maps=SNAPSHOT_MAP_CACHE_SIZE):
+        self.max_maps = max_maps
+        self._maps = OrderedDict()
+
+    def read(self, chain, symbol, hours, interval_hours):
+        if not CHART_SNAPSHOTS_ENABLED:
+            return None
+        # Only known chains, the name ends up in a path
+        if chain not in SUBGRAPH_ENDPOINTS:
+            return None
+        if (hours, interval_hours) not in CHART_SNAPSHOT_WINDOWS:
+            return None
+
+        path = snapshot_path(chain, symbol, hours, interval_hours, snapshot_hour())
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        cached = self._maps.get(path)
+        if cached and cached[0] == (stat.st_ino, stat.st_mtime_ns):
+            self._maps.move_to_end(path)
+            return memoryview(cached[1])
+
+        try:
+            with open(path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # Pruned in between, or empty
+            return None
+
+        # Replaced and evicted maps are not closed, responses still being
+        # sent hold views on them and release them when done
+        self._maps[path] = ((stat.st_ino, stat.st_mtime_ns), mapped)
+        self._maps.move_to_end(path)
+        while len(self._maps) > self.max_maps:
+            self._maps.popitem(last=False)
+        return memoryview(mapped)
+
+
+snapshot_reader = SnapshotReader()
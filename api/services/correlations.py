@@ -0,0 +1,88 @@
+from collections import OrderedDict
+import numpy as np
+
+
+"""
+    Cross-token return statistics.
+
+    Aligned hourly closes for many tokens are laid out as a dense
+    (hour x token) matrix, gaps are forward-filled, and the covariance and
+    correlation of log returns for every pair are computed with a handful
+    of matrix products. Pairs only use the hours where both tokens have a
+    return, so recently listed tokens do not shrink everyone's sample.
+"""
+
+
+def close_matrix(hour_index, token_index, closes, n_hours, n_tokens):
+    """
+    Scatter (hour, token, close) observations into a dense matrix and
+    forward-fill gaps. Hours before a token's first close stay NaN.
+    """
+    matrix = np.full((n_hours, n_tokens), np.nan)
+    matrix[hour_index, token_index] = closes
+    # Non-positive closes have no log return, treat them as missing
+    matrix[~(matrix > 0)] = np.nan
+
+    # Row of the last known close for every cell, then gather
+    known = ~np.isnan(matrix)
+    last_known = np.where(known, np.arange(n_hours)[:, None], 0)
+    np.maximum.accumulate(last_known, axis=0, out=last_known)
+    filled = matrix[last_known, np.arange(n_tokens)]
+    # Cells before the first close picked up row 0, which may be a gap
+    filled[np.cumsum(known, axis=0) == 0] = np.nan
+    return filled
+
+
+def return_statistics(closes):
+    """
+    Pairwise-complete covariance and correlation of log returns
+    for a (hour x token) close matrix.
+    """
+    returns = np.diff(np.log(closes), axis=0)
+    valid = (~np.isnan(returns)).astype(np.float64)
+    values = np.nan_to_num(returns)
+
+    # For every pair (i, j), sums over the hours where both are valid
+    counts = valid.T @ valid
+    sum_x = values.T @ valid
+    sum_y = sum_x.T
+    sum_xx = (values * values).T @ valid
+    sum_yy = sum_xx.T
+    sum_xy = values.T @ values
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = (sum_xy - sum_x * sum_y / counts) / (counts - 1)
+        correlation = (counts * sum_xy - sum_x * sum_y) / np.sqrt(
+            (counts * sum_xx - sum_x**2) * (counts * sum_yy - sum_y**2)
+        )
+    covariance[counts < 2] = np.nan
+    correlation[counts < 2] = np.nan
+    np.clip(correlation, -1.0, 1.0, out=correlation)
+    return covariance, correlation, counts
+
+
+class CorrelationCache:
+    """
+    Small LRU of computed matrices, cleared whenever an ingest cycle commits.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is not None:
+            self.entries.move_to_end(key)
+        return result
+
+    def set(self, key, result):
+        self.entries[key] = result
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+correlation_cache = CorrelationCache()
@@ -1,25 +1,172 @@
+import logging
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from config import DATABASE_URL
+from services.query_profiler import query_profiler
+from config import (
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_ECHO,
+    DATABASE_REPLICA_URL,
+    DB_REPLICA_MAX_LAG_SECONDS,
+    DB_REPLICA_CHECK_INTERVAL,
+    DB_REPLICA_TIMEOUT_SECONDS,
+)
 
 
-async_engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+async_engine = create_async_engine(
+    DATABASE_URL,
+    echo=DB_ECHO,
+    future=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+)
 AsyncSessionLocal = sessionmaker(
     async_engine, class_=AsyncSession, expire_on_commit=False
 )
 Base = declarative_base()
 
+# Read-only engine for the query endpoints, None when no replica is configured
+replica_engine = (
+    create_async_engine(
+        DATABASE_REPLICA_URL,
+        future=True,
+        # asyncpg waits 60s for a connection by default
+        connect_args={"timeout": DB_REPLICA_TIMEOUT_SECONDS},
+    )
+    if DATABASE_REPLICA_URL
+    else None
+)
+# Statement timing for the slow query log
+query_profiler.attach(async_engine, "primary")
+if replica_engine is not None:
+    query_profiler.attach(replica_engine, "replica")
+
+AsyncReadSessionLocal = (
+    sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+    if replica_engine
+    else None
+)
+
+# Last known replica health, refreshed at most every DB_REPLICA_CHECK_INTERVAL
+replica_state = {
+    "healthy": False,
+    "lag_seconds": None,
+    "checked_at": None,
+    "error": None,
+}
+
+# Replay lag is zero when the replica has applied everything it received,
+# otherwise the age of the last replayed transaction
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END AS lag_seconds
+    """
+)
+
+
+async def query_replica_lag():
+    async with replica_engine.connect() as conn:
+        result = await conn.execute(REPLICA_LAG_QUERY)
+        return float(result.scalar_one())
+
+
+async def check_replica():
+    try:
+        # Connecting and the query share one deadline
+        lag_seconds = await asyncio.wait_for(
+            query_replica_lag(), DB_REPLICA_TIMEOUT_SECONDS
+        )
+        replica_state.update(
+            healthy=lag_seconds <= DB_REPLICA_MAX_LAG_SECONDS,
+            lag_seconds=lag_seconds,
+            error=None,
+        )
+    except Exception as e:
+        replica_state.update(healthy=False, lag_seconds=None, error=str(e))
+
+    if not replica_state["healthy"]:
+        logging.warning("Read replica unavailable, using primary: %s", replica_state)
+
+
+async def replica_available():
+    if replica_engine is None:
+        return False
+
+    checked_at = replica_state["checked_at"]
+    if checked_at is None or time.monotonic() - checked_at >= DB_REPLICA_CHECK_INTERVAL:
+        # Stamp before checking so concurrent requests use the last known
+        # state instead of all probing the replica at once
+        replica_state["checked_at"] = time.monotonic()
+        await check_replica()
+
+    return replica_state["healthy"]
+
 
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
 
 
+async def get_read_db():
+    # Read-only routes use the replica, falling back to the primary
+    if await replica_available():
+        async with AsyncReadSessionLocal() as session:
+            yield session
+    else:
+        async with AsyncSessionLocal() as session:
+            yield session
+
+
+# For work that outlives a single request, e.g. a query shared by
+# coalesced requests
+read_session = asynccontextmanager(get_read_db)
+
+
+def engine_pool_stats(engine):
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "status": pool.status(),
+    }
+
+
+def pool_stats():
+    stats = {"primary": engine_pool_stats(async_engine)}
+    if replica_engine is not None:
+        stats["replica"] = dict(
+            engine_pool_stats(replica_engine),
+            healthy=replica_state["healthy"],
+            lag_seconds=replica_state["lag_seconds"],
+            error=replica_state["error"],
+        )
+    return stats
+
+
 async def init_db():
     async with async_engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
 
 
+async def create_db():
+    # Create any missing tables without dropping existing data
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
 async def close_db():
     await async_engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
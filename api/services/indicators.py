@@ -0,0 +1,424 @@
+import logging
+import math
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy.future import select
+from models.chart_data import PriceData
+from config import INDICATOR_LOOKBACK_HOURS, INDICATOR_CACHE_SIZE
+
+
+"""
+    Technical indicators over a token's hourly close series.
+
+    Every indicator has a vectorized compute() over the whole series, used
+    once when a series is first requested, and an O(1) step() that advances
+    the indicator state by one new close. The cache keeps one series per
+    (token, indicator, params), and the ingest pipeline hands every committed
+    batch of price rows to IndicatorCache.on_price_rows, so new candles are
+    applied with step() instead of recomputing the window.
+"""
+
+
+def ema(values, alpha, initial):
+    """
+    Exponential moving average of values, continuing from initial:
+        y[j] = (1 - alpha) * y[j - 1] + alpha * values[j]
+
+    Vectorized in closed form, y[j] = d^(j+1) * (initial + alpha *
+    sum(values[i] * d^-(i+1))) with d = 1 - alpha, evaluated in blocks
+    short enough that d^-(j+1) stays well inside float64 range.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    decay = 1.0 - alpha
+    block = max(1, int(300 / -math.log(decay)))
+    out = np.empty(len(values))
+    carry = initial
+    for start in range(0, len(values), block):
+        chunk = values[start : start + block]
+        powers = decay ** np.arange(1, len(chunk) + 1)
+        out[start : start + len(chunk)] = powers * (
+            carry + alpha * np.cumsum(chunk / powers)
+        )
+        carry = out[start + len(chunk) - 1]
+    return out
+
+
+class SMA:
+    labels = ("sma",)
+
+    def __init__(self, period):
+        self.period = period
+        self.key = ("sma", period)
+        self.warmup = period
+
+    def compute(self, closes):
+        p = self.period
+        out = np.full(len(closes), np.nan)
+        cumsum = np.cumsum(np.insert(closes, 0, 0.0))
+        out[p - 1 :] = (cumsum[p:] - cumsum[:-p]) / p
+        return (out,), (float(closes[-p:].sum()),)
+
+    def step(self, state, closes):
+        (total,) = state
+        return (total + closes[-1] - closes[-1 - self.period],)
+
+    def value(self, state):
+        return (state[0] / self.period,)
+
+
+class EMA:
+    labels = ("ema",)
+
+    def __init__(self, period):
+        self.period = period
+        self.key = ("ema", period)
+        self.alpha = 2.0 / (period + 1)
+        # Seeded with the first close, hidden until period closes are in
+        self.warmup = period
+
+    def compute(self, closes):
+        out = np.empty(len(closes))
+        out[0] = closes[0]
+        out[1:] = ema(closes[1:], self.alpha, closes[0])
+        state = (float(out[-1]),)
+        out[: self.period - 1] = np.nan
+        return (out,), state
+
+    def step(self, state, closes):
+        return (self.alpha * closes[-1] + (1 - self.alpha) * state[0],)
+
+    def value(self, state):
+        return state
+
+
+class RSI:
+    """
+    Relative strength index with Wilder smoothing, seeded by the simple
+    average gain and loss of the first period changes.
+    """
+
+    labels = ("rsi",)
+
+    def __init__(self, period):
+        self.period = period
+        self.key = ("rsi", period)
+        self.warmup = period + 1
+
+    def compute(self, closes):
+        p = self.period
+        out = np.full(len(closes), np.nan)
+        deltas = np.diff(closes)
+        gains = np.maximum(deltas, 0.0)
+        losses = np.maximum(-deltas, 0.0)
+        avg_gain = np.empty(len(deltas) - p + 1)
+        avg_loss = np.empty(len(deltas) - p + 1)
+        avg_gain[0] = gains[:p].mean()
+        avg_loss[0] = losses[:p].mean()
+        avg_gain[1:] = ema(gains[p:], 1.0 / p, avg_gain[0])
+        avg_loss[1:] = ema(losses[p:], 1.0 / p, avg_loss[0])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+        # No losses is 100, a flat window is neutral
+        rsi[avg_loss == 0] = 100.0
+        rsi[(avg_loss == 0) & (avg_gain == 0)] = 50.0
+        out[p:] = rsi
+        return (out,), (float(avg_gain[-1]), float(avg_loss[-1]))
+
+    def step(self, state, closes):
+        avg_gain, avg_loss = state
+        delta = closes[-1] - closes[-2]
+        p = self.period
+        return (
+            (avg_gain * (p - 1) + max(delta, 0.0)) / p,
+            (avg_loss * (p - 1) + max(-delta, 0.0)) / p,
+        )
+
+    def value(self, state):
+        avg_gain, avg_loss = state
+        if avg_loss == 0:
+            return (100.0 if avg_gain > 0 else 50.0,)
+        return (100.0 - 100.0 / (1.0 + avg_gain / avg_loss),)
+
+
+class Bollinger:
+    labels = ("bb_middle", "bb_upper", "bb_lower")
+
+    def __init__(self, period, num_std):
+        self.period = period
+        self.num_std = num_std
+        self.key = ("bollinger", period, num_std)
+        self.warmup = period
+
+    def compute(self, closes):
+        p = self.period
+        middle = np.full(len(closes), np.nan)
+        std = np.full(len(closes), np.nan)
+        windows = sliding_window_view(closes, p)
+        middle[p - 1 :] = windows.mean(axis=1)
+        std[p - 1 :] = windows.std(axis=1)
+        tail = closes[-p:]
+        state = (float(tail.sum()), float((tail * tail).sum()))
+        return (
+            middle,
+            middle + self.num_std * std,
+            middle - self.num_std * std,
+        ), state
+
+    def step(self, state, closes):
+        total, total_sq = state
+        new, old = closes[-1], closes[-1 - self.period]
+        return (total + new - old, total_sq + new * new - old * old)
+
+    def value(self, state):
+        total, total_sq = state
+        mean = total / self.period
+        std = math.sqrt(max(total_sq / self.period - mean * mean, 0.0))
+        return (mean, mean + self.num_std * std, mean - self.num_std * std)
+
+
+def log_returns(closes):
+    # Non-positive closes (dead or illiquid tokens) have no log return
+    closes = np.asarray(closes, dtype=np.float64)
+    return np.diff(np.log(np.where(closes > 0, closes, np.nan)))
+
+
+def log_return(new, old):
+    if new > 0 and old > 0:
+        return math.log(new / old)
+    return math.nan
+
+
+class Volatility:
+    """
+    Rolling sample standard deviation of hourly log returns
+    over period returns (not annualized). Windows with a non-positive
+    close have no value.
+    """
+
+    labels = ("volatility",)
+
+    def __init__(self, period):
+        self.period = period
+        self.key = ("volatility", period)
+        self.warmup = period + 1
+
+    def compute(self, closes):
+        p = self.period
+        out = np.full(len(closes), np.nan)
+        returns = log_returns(closes)
+        out[p:] = sliding_window_view(returns, p).std(axis=1, ddof=1)
+        return (out,), self.window_state(returns[-p:])
+
+    def window_state(self, returns):
+        return (float(returns.sum()), float((returns * returns).sum()))
+
+    def step(self, state, closes):
+        total, total_sq = state
+        p = self.period
+        new = log_return(closes[-1], closes[-2])
+        old = log_return(closes[-1 - p], closes[-2 - p])
+        if math.isnan(total) or math.isnan(new) or math.isnan(old):
+            # A missing return entered or is leaving the window, running
+            # sums cannot drop a NaN so rebuild them from the window
+            return self.window_state(log_returns(closes[-1 - p :]))
+        return (total + new - old, total_sq + new * new - old * old)
+
+    def value(self, state):
+        total, total_sq = state
+        if math.isnan(total):
+            return (math.nan,)
+        p = self.period
+        return (math.sqrt(max((total_sq - total * total / p) / (p - 1), 0.0)),)
+
+
+def make_indicator(name, period, num_std=2.0):
+    if name == "sma":
+        return SMA(period)
+    if name == "ema":
+        return EMA(period)
+    if name == "rsi":
+        return RSI(period)
+    if name == "bollinger":
+        return Bollinger(period, num_std)
+    if name == "volatility":
+        return Volatility(period)
+    raise ValueError(f"Unknown indicator: {name}")
+
+
+class IndicatorSeries:
+    """
+    One indicator over one token's close series, updated in place as
+    new closes arrive. Timestamps are unix seconds.
+    """
+
+    def __init__(self, indicator, timestamps, closes, max_length):
+        self.indicator = indicator
+        self.max_length = max_length
+        self.timestamps = list(timestamps[:-1])
+        self.closes = list(closes[:-1])
+        self.state = None
+        self.prev_state = None
+        if len(self.closes) >= indicator.warmup:
+            outputs, self.state = indicator.compute(
+                np.asarray(self.closes, dtype=np.float64)
+            )
+            self.outputs = [output.tolist() for output in outputs]
+        else:
+            self.outputs = [[math.nan] * len(self.closes) for _ in indicator.labels]
+        # The last close goes through add(), so it can be revised with step()
+        if len(closes):
+            self.add(timestamps[-1], closes[-1])
+
+    def advance(self, state):
+        if state is None:
+            if len(self.closes) < self.indicator.warmup:
+                return None, [math.nan] * len(self.indicator.labels)
+            # Enough closes for the first value, a one off compute
+            _, state = self.indicator.compute(
+                np.asarray(self.closes, dtype=np.float64)
+            )
+        else:
+            state = self.indicator.step(state, self.closes)
+        return state, self.indicator.value(state)
+
+    def add(self, timestamp, close):
+        """
+        Apply one close in O(1). A close for the latest hour revises it,
+        a newer hour is appended. Returns False for an older hour, which
+        cannot be applied incrementally.
+        """
+        if self.timestamps and timestamp == self.timestamps[-1]:
+            self.closes[-1] = close
+            self.state, values = self.advance(self.prev_state)
+            for output, value in zip(self.outputs, values):
+                output[-1] = value
+            return True
+
+        if self.timestamps and timestamp < self.timestamps[-1]:
+            return False
+
+        self.timestamps.append(timestamp)
+        self.closes.append(close)
+        self.prev_state = self.state
+        self.state, values = self.advance(self.state)
+        for output, value in zip(self.outputs, values):
+            output.append(value)
+
+        # Trim in bulk so appends stay amortized O(1)
+        if len(self.timestamps) > 2 * self.max_length:
+            drop = len(self.timestamps) - self.max_length
+            del self.timestamps[:drop]
+            del self.closes[:drop]
+            for output in self.outputs:
+                del output[:drop]
+        return True
+
+    def to_chart_data(self, since):
+        """
+        Series in the chart-data shape, one list per output of
+        [timestamp, label, value] from the since unix time onwards.
+        """
+        start = int(np.searchsorted(self.timestamps, since))
+        timestamps = [
+            datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat()
+            for ts in self.timestamps[start:]
+        ]
+        return [
+            [
+                [ts, label, None if math.isnan(value) else value]
+                for ts, value in zip(timestamps, output[start:])
+            ]
+            for label, output in zip(self.indicator.labels, self.outputs)
+        ]
+
+
+class IndicatorCache:
+    """
+    LRU cache of IndicatorSeries keyed by (token_id, indicator key).
+    """
+
+    def __init__(
+        self,
+        max_entries=INDICATOR_CACHE_SIZE,
+        lookback_hours=INDICATOR_LOOKBACK_HOURS,
+    ):
+        self.max_entries = max_entries
+        self.lookback_hours = lookback_hours
+        self.entries = OrderedDict()
+        # Bumped per token on every applied batch, a series built from a
+        # query that raced with a batch is served but not cached
+        self.versions = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, db_session, token_id, indicator):
+        key = (token_id, indicator.key)
+        series = self.entries.get(key)
+        if series is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return series
+
+        self.misses += 1
+        version = self.versions.get(token_id, 0)
+        start_time = datetime.now(timezone.utc) - timedelta(hours=self.lookback_hours)
+        result = await db_session.execute(
+            select(PriceData.timestamp, PriceData.close)
+            .filter(PriceData.token_id == token_id, PriceData.timestamp >= start_time)
+            .order_by(PriceData.timestamp)
+        )
+        rows = result.fetchall()
+        series = IndicatorSeries(
+            indicator,
+            [row.timestamp.timestamp() for row in rows],
+            [float(row.close) for row in rows],
+            self.lookback_hours,
+        )
+        if self.versions.get(token_id, 0) == version:
+            self.entries[key] = series
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return series
+
+    def on_price_rows(self, rows):
+        """
+        Apply committed price_data rows (dicts with token_id, timestamp and
+        close) to the cached series of their tokens.
+        """
+        by_token = {}
+        for row in rows:
+            by_token.setdefault(row["token_id"], []).append(
+                (row["timestamp"].timestamp(), float(row["close"]))
+            )
+        for token_id in by_token:
+            self.versions[token_id] = self.versions.get(token_id, 0) + 1
+
+        for key, series in list(self.entries.items()):
+            closes = by_token.get(key[0])
+            if not closes:
+                continue
+            for timestamp, close in sorted(closes):
+                try:
+                    applied = series.add(timestamp, close)
+                except Exception as e:
+                    # Runs inside the ingest writer, never raise from here
+                    logging.warning("Dropping indicator cache entry %s: %s", key, e)
+                    applied = False
+                if not applied:
+                    # Out of order or bad data, recompute on the next request
+                    logging.debug("Invalidating indicator cache entry %s", key)
+                    del self.entries[key]
+                    break
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+indicator_cache = IndicatorCache()
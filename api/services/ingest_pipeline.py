@@ -0,0 +1,257 @@
+import logging
+import time
+import asyncio
+from services.database import AsyncSessionLocal
+from config import (
+    INGEST_FETCH_CONCURRENCY,
+    INGEST_QUEUE_SIZE,
+    INGEST_WRITE_BATCH_ROWS,
+    INGEST_WRITERS,
+    INGEST_WRITE_RETRIES,
+)
+
+
+# The most recent pipeline per name (chain), read by the debug stats route
+current_pipelines = {}
+
+
+class IngestPipeline:
+    """
+    Two stage price ingest: fetchers pull candle pages from the subgraph
+    and push parsed rows onto a bounded queue, writers drain the queue and
+    coalesce pages from many tokens into large batched upserts, one commit
+    per batch.
+
+    The bounded queue applies backpressure, when the writers fall behind
+    the fetchers block on put, so at most INGEST_QUEUE_SIZE pages are held
+    in memory while both the network and the database stay busy.
+
+    fetch_pages(address, start_timestamp) is an async iterator of subgraph
+    pages, format_rows(token_id, page) turns a page into price_data rows and
+    write_rows(db_session, rows) upserts rows without committing. The
+    optional on_commit(rows) is called with every committed batch.
+
+    A batch that still fails after its retries is dropped, and the earliest
+    hour it held for each token is kept in failed_from so the caller can
+    start those tokens from there next cycle. Writers commit out of order,
+    so a later page of the same token may already be stored.
+    """
+
+    def __init__(
+        self,
+        name,
+        fetch_pages,
+        format_rows,
+        write_rows,
+        fetch_concurrency=INGEST_FETCH_CONCURRENCY,
+        queue_size=INGEST_QUEUE_SIZE,
+        write_batch_rows=INGEST_WRITE_BATCH_ROWS,
+        writers=INGEST_WRITERS,
+        write_retries=INGEST_WRITE_RETRIES,
+        on_commit=None,
+        session_factory=AsyncSessionLocal,
+    ):
+        self.name = name
+        self.fetch_pages = fetch_pages
+        self.format_rows = format_rows
+        self.write_rows = write_rows
+        self.on_commit = on_commit
+        self.fetch_concurrency = fetch_concurrency
+        self.write_batch_rows = write_batch_rows
+        self.writers = writers
+        self.write_retries = write_retries
+        self.session_factory = session_factory
+        # token_id -> earliest timestamp of a dropped batch
+        self.failed_from = {}
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.counters = {
+            "tokens": 0,
+            "started_at": None,
+            "finished_at": None,
+            "queue_high_water": 0,
+            "fetch_pages": 0,
+            "fetch_rows": 0,
+            "fetch_errors": 0,
+            "fetch_busy_seconds": 0.0,
+            "fetch_finished_at": None,
+            "write_batches": 0,
+            "write_rows": 0,
+            "write_errors": 0,
+            "write_retries": 0,
+            "on_commit_errors": 0,
+            "write_busy_seconds": 0.0,
+        }
+
+    async def fetcher(self, jobs):
+        while jobs:
+            token_id, token_address, start_timestamp = jobs.pop()
+            try:
+                started = time.monotonic()
+                async for page in self.fetch_pages(token_address, start_timestamp):
+                    rows = self.format_rows(token_id, page)
+                    self.counters["fetch_busy_seconds"] += time.monotonic() - started
+                    self.counters["fetch_pages"] += 1
+                    self.counters["fetch_rows"] += len(rows)
+                    # Blocks while the queue is full
+                    await self.queue.put(rows)
+                    self.counters["queue_high_water"] = max(
+                        self.counters["queue_high_water"], self.queue.qsize()
+                    )
+                    started = time.monotonic()
+            except Exception as e:
+                self.counters["fetch_errors"] += 1
+                logging.error("Fetching price data for %s failed: %s", token_address, e)
+
+    async def next_batch(self):
+        # Wait for one page, then take whatever else is already queued
+        # up to the batch size. None marks the end of the fetch stage.
+        rows = await self.queue.get()
+        if rows is None:
+            return None, True
+        batch = list(rows)
+        while len(batch) < self.write_batch_rows and not self.queue.empty():
+            rows = self.queue.get_nowait()
+            if rows is None:
+                return batch, True
+            batch.extend(rows)
+        return batch, False
+
+    async def write_batch(self, session, batch):
+        # Retry transient failures before giving the batch up
+        for attempt in range(self.write_retries + 1):
+            try:
+                await self.write_rows(session, batch)
+                await session.commit()
+                return True
+            except Exception as e:
+                await session.rollback()
+                logging.error(
+                    "Writing %s price rows failed (attempt %s): %s",
+                    len(batch),
+                    attempt + 1,
+                    e,
+                )
+                if attempt < self.write_retries:
+                    self.counters["write_retries"] += 1
+                    await asyncio.sleep(0.5 * (attempt + 1))
+        return False
+
+    def record_failed(self, batch):
+        for row in batch:
+            earliest = self.failed_from.get(row["token_id"])
+            if earliest is None or row["timestamp"] < earliest:
+                self.failed_from[row["token_id"]] = row["timestamp"]
+
+    async def writer(self):
+        async with self.session_factory() as session:
+            done = False
+            while not done:
+                batch, done = await self.next_batch()
+                if not batch:
+                    continue
+                started = time.monotonic()
+                try:
+                    written = await self.write_batch(session, batch)
+                finally:
+                    self.counters["write_busy_seconds"] += time.monotonic() - started
+                if not written:
+                    self.counters["write_errors"] += 1
+                    self.record_failed(batch)
+                    continue
+                self.counters["write_batches"] += 1
+                self.counters["write_rows"] += len(batch)
+                if self.on_commit is not None:
+                    # The rows are committed, a failing hook must not stop
+                    # the writer and leave the fetchers blocked on the queue
+                    try:
+                        self.on_commit(batch)
+                    except Exception as e:
+                        self.counters["on_commit_errors"] += 1
+                        logging.error("%s on_commit failed: %s", self.name, e)
+
+    async def put_end_markers(self):
+        for _ in range(self.writers):
+            await self.queue.put(None)
+
+    async def run(self, jobs):
+        """
+        Ingest (token_id, token_address, start_timestamp) jobs.
+        """
+        current_pipelines[self.name] = self
+        jobs = list(jobs)
+        self.counters["tokens"] = len(jobs)
+        self.counters["started_at"] = time.monotonic()
+
+        writers = [asyncio.create_task(self.writer()) for _ in range(self.writers)]
+        fetchers = [
+            asyncio.create_task(self.fetcher(jobs))
+            for _ in range(min(self.fetch_concurrency, len(jobs)))
+        ]
+        end_markers = None
+        try:
+            # Wait for the fetch stage, failing fast if a writer stops early,
+            # nothing would drain the queue and the fetchers would block
+            fetching = set(fetchers)
+            while fetching:
+                done, _ = await asyncio.wait(
+                    fetching | set(writers), return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    task.result()
+                    if task not in fetching:
+                        raise RuntimeError(f"{self.name} ingest writer stopped early")
+                fetching -= done
+            self.counters["fetch_finished_at"] = time.monotonic()
+            # One end marker per writer, queued behind the remaining pages
+            end_markers = asyncio.create_task(self.put_end_markers())
+            await asyncio.gather(*writers)
+        finally:
+            for task in fetchers + writers + [end_markers]:
+                if task is not None:
+                    task.cancel()
+        self.counters["finished_at"] = time.monotonic()
+
+        logging.info("%s ingest pipeline finished: %s", self.name, self.stats())
+
+    def stats(self):
+        counters = self.counters
+        now = time.monotonic()
+        started_at = counters["started_at"] or now
+        fetch_seconds = (counters["fetch_finished_at"] or now) - started_at
+        write_seconds = (counters["finished_at"] or now) - started_at
+        return {
+            "running": counters["started_at"] is not None
+            and counters["finished_at"] is None,
+            "tokens": counters["tokens"],
+            "queue": {
+                "depth": self.queue.qsize(),
+                "max_size": self.queue.maxsize,
+                "high_water": counters["queue_high_water"],
+            },
+            "fetch": {
+                "pages": counters["fetch_pages"],
+                "rows": counters["fetch_rows"],
+                "errors": counters["fetch_errors"],
+                "busy_seconds": round(counters["fetch_busy_seconds"], 3),
+                "rows_per_second": round(
+                    counters["fetch_rows"] / fetch_seconds, 1
+                ) if fetch_seconds else None,
+            },
+            "write": {
+                "batches": counters["write_batches"],
+                "rows": counters["write_rows"],
+                "errors": counters["write_errors"],
+                "retries": counters["write_retries"],
+                "on_commit_errors": counters["on_commit_errors"],
+                "tokens_to_refetch": len(self.failed_from),
+                "busy_seconds": round(counters["write_busy_seconds"], 3),
+                "rows_per_second": round(
+                    counters["write_rows"] / write_seconds, 1
+                ) if write_seconds else None,
+            },
+            "elapsed_seconds": round(write_seconds, 3),
+        }
+
+
+def pipeline_stats():
+    return {name: pipeline.stats() for name, pipeline in current_pipelines.items()}
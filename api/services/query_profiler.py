@@ -0,0 +1,134 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from sqlalchemy import event
+from config import (
+    SLOW_QUERY_THRESHOLD_MS,
+    SLOW_QUERY_LOG_SIZE,
+    EXPLAIN_THRESHOLD_MS,
+    EXPLAIN_COOLDOWN_SECONDS,
+)
+
+
+# Statements worth an automatic EXPLAIN when slow, the chart-data CTE
+EXPLAIN_STATEMENT_MARKERS = ("WITH time_series AS",)
+
+
+class QueryProfiler:
+    """
+    Statement timing through SQLAlchemy engine events, as a cheaper and more
+    targeted alternative to echo. Keeps the slowest statements seen, a ring
+    buffer of recent slow statements with their parameters, and EXPLAIN
+    (ANALYZE, BUFFERS) plans captured in the background for slow chart
+    queries, at most one per marker every EXPLAIN_COOLDOWN_SECONDS.
+    """
+
+    def __init__(self):
+        self.statements = 0
+        self.total_seconds = 0.0
+        self.slowest = []
+        self.recent_slow = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+        self.explains = deque(maxlen=20)
+        self.last_explain = {}
+        self.sequence = itertools.count()
+        self.tasks = set()
+
+    def attach(self, async_engine, engine_name):
+        sync_engine = async_engine.sync_engine
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def before_cursor_execute(
+            conn, cursor, statement, parameters, context, executemany
+        ):
+            conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def after_cursor_execute(
+            conn, cursor, statement, parameters, context, executemany
+        ):
+            duration = time.perf_counter() - conn.info["query_start_times"].pop()
+            self.record(async_engine, engine_name, statement, parameters, duration)
+
+        @event.listens_for(sync_engine, "handle_error")
+        def handle_error(exception_context):
+            start_times = exception_context.connection.info.get("query_start_times")
+            if start_times:
+                start_times.pop()
+
+    def record(self, async_engine, engine_name, statement, parameters, duration):
+        self.statements += 1
+        self.total_seconds += duration
+        duration_ms = duration * 1000
+        if duration_ms < SLOW_QUERY_THRESHOLD_MS:
+            return
+
+        entry = {
+            "engine": engine_name,
+            "duration_ms": round(duration_ms, 2),
+            "statement": statement[:2000],
+            "parameters": repr(parameters)[:500],
+            "at": datetime.now(timezone.utc).isoformat(),
+        }
+        logging.warning("Slow query on %s (%.1f ms)", engine_name, duration_ms)
+        self.recent_slow.append(entry)
+        # Min-heap of the slowest statements, the fastest is evicted
+        item = (duration_ms, next(self.sequence), entry)
+        if len(self.slowest) < SLOW_QUERY_LOG_SIZE:
+            heapq.heappush(self.slowest, item)
+        else:
+            heapq.heappushpop(self.slowest, item)
+
+        if duration_ms >= EXPLAIN_THRESHOLD_MS:
+            self.maybe_explain(async_engine, engine_name, statement, parameters, entry)
+
+    def maybe_explain(self, async_engine, engine_name, statement, parameters, entry):
+        if statement.lstrip().upper().startswith("EXPLAIN"):
+            return
+        marker = next((m for m in EXPLAIN_STATEMENT_MARKERS if m in statement), None)
+        if marker is None:
+            return
+        now = time.monotonic()
+        last_explain = self.last_explain.get(marker)
+        if last_explain is not None and now - last_explain < EXPLAIN_COOLDOWN_SECONDS:
+            return
+        self.last_explain[marker] = now
+        # Events run inside the query's await, so the plan is captured
+        # on its own connection after the request has moved on
+        task = asyncio.get_running_loop().create_task(
+            self.capture_explain(
+                async_engine, engine_name, statement, parameters, entry
+            )
+        )
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def capture_explain(
+        self, async_engine, engine_name, statement, parameters, entry
+    ):
+        try:
+            async with async_engine.connect() as conn:
+                result = await conn.exec_driver_sql(
+                    "EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters
+                )
+                plan = "\n".join(row[0] for row in result)
+        except Exception as e:
+            plan = f"EXPLAIN failed: {e}"
+        self.explains.append(dict(entry, engine=engine_name, plan=plan))
+
+    def stats(self):
+        return {
+            "statements": self.statements,
+            "total_seconds": round(self.total_seconds, 3),
+            "slow_threshold_ms": SLOW_QUERY_THRESHOLD_MS,
+            "explain_threshold_ms": EXPLAIN_THRESHOLD_MS,
+            "slowest": [entry for _, _, entry in sorted(self.slowest, reverse=True)],
+            "recent_slow": list(self.recent_slow),
+            "explains": list(self.explains),
+        }
+
+
+query_profiler = QueryProfiler()
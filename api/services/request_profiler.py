@@ -0,0 +1,79 @@
+import cProfile
+import io
+import itertools
+import pstats
+import time
+from collections import deque
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # optional, cProfile is used instead
+    Profiler = None
+
+
+class RequestProfiler:
+    """
+    Opt-in profiling of single requests. pyinstrument follows the request's
+    coroutine across awaits. The cProfile fallback profiles the whole event
+    loop thread for the duration of the request, so concurrent requests
+    show up in its report as well.
+    """
+
+    def __init__(self, max_profiles=20):
+        self.profiles = deque(maxlen=max_profiles)
+        self.ids = itertools.count(1)
+
+    async def profile(self, request, call_next):
+        started = time.perf_counter()
+        if Profiler is not None:
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+            try:
+                response = await call_next(request)
+            finally:
+                profiler.stop()
+            report = profiler.output_text(unicode=True, color=False)
+            tool = "pyinstrument"
+        else:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Only one cProfile can be active at a time, serve unprofiled
+                return await call_next(request)
+            try:
+                response = await call_next(request)
+            finally:
+                profiler.disable()
+            output = io.StringIO()
+            stats = pstats.Stats(profiler, stream=output)
+            stats.sort_stats("cumulative").print_stats(50)
+            report = output.getvalue()
+            tool = "cProfile"
+
+        profile_id = next(self.ids)
+        self.profiles.append(
+            {
+                "id": profile_id,
+                "method": request.method,
+                "path": request.url.path,
+                "query": request.url.query,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "tool": tool,
+                "report": report,
+            }
+        )
+        response.headers["X-Profile-Id"] = str(profile_id)
+        return response
+
+    def get(self, profile_id):
+        return next((p for p in self.profiles if p["id"] == profile_id), None)
+
+    def summaries(self):
+        return [
+            {k: v for k, v in profile.items() if k != "report"}
+            for profile in self.profiles
+        ]
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,90 @@
+import asyncio
+import time
+import aiohttp
+from config import SUBGRAPH_ENDPOINTS, SUBGRAPH_CONNECTIONS
+
+
+class RateLimiter:
+    """
+    Spaces out acquisitions to at most rate per second. There is no await
+    between reading and reserving the next slot, so it is safe to share
+    between tasks on one event loop.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class SubgraphClient:
+    """
+    HTTP access to one subgraph deployment, with its own connection pool
+    and rate limit. Shared by every service working on that chain.
+    """
+
+    def __init__(self, chain, url, rate_limit, connections=SUBGRAPH_CONNECTIONS):
+        self.chain = chain
+        self.url = url
+        self.connections = connections
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.session = None
+        self.requests = 0
+        self.errors = 0
+
+    async def query(self, query):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections)
+            )
+        await self.rate_limiter.acquire()
+        self.requests += 1
+        try:
+            async with self.session.post(self.url, json={"query": query}) as response:
+                data = await response.json()
+            return data["data"]
+        except Exception:
+            self.errors += 1
+            raise
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "rate_limit": (1.0 / self.rate_limiter.interval)
+            if self.rate_limiter.interval
+            else None,
+            "connections": self.connections,
+        }
+
+
+subgraph_clients = {}
+
+
+def get_subgraph_client(chain):
+    client = subgraph_clients.get(chain)
+    if client is None:
+        endpoint = SUBGRAPH_ENDPOINTS[chain]
+        client = SubgraphClient(chain, endpoint["url"], endpoint["rate_limit"])
+        subgraph_clients[chain] = client
+    return client
+
+
+async def close_subgraph_clients():
+    for client in subgraph_clients.values():
+        await client.close()
+
+
+def subgraph_stats():
+    return {chain: client.stats() for chain, client in subgraph_clients.items()}
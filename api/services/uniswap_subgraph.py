@@ -1,19 +1,63 @@
 import logging
-import aiohttp
 import asyncio
 import json
+import time
 from datetime import datetime, timedelta
 from sqlalchemy.future import select
-from sqlalchemy import insert, update
+from sqlalchemy import insert, update, func
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from models.token import Token
 from models.chart_data import PriceData
-from config import UNISWAP_SUBGRAPH_URL
+from services.database import AsyncSessionLocal
+from services.ingest_pipeline import IngestPipeline
+from services.indicators import indicator_cache
+from services.correlations import correlation_cache
+from services.subgraph_client import get_subgraph_client
+from services.chart_snapshots import write_chart_snapshots
+from config import (
+    DEFAULT_CHAIN,
+    SUBGRAPH_ENDPOINTS,
+    SUBGRAPH_PAGE_SIZE,
+    TOKEN_DISCOVERY_TOP_N,
+    TOKEN_DISCOVERY_INTERVAL,
+    CHART_SNAPSHOTS_ENABLED,
+)
+
+
+# asyncpg allows at most 32767 bind parameters per statement,
+# keep bulk upserts well below that
+UPSERT_BATCH_SIZE = 1000
+
+# token_id -> earliest hour of a price batch that failed to write, the next
+# ingest starts the token from there rather than from its newest stored hour
+pending_refetch = {}
+
+
+async def upsert_price_rows(db_session, rows):
+    """
+    Bulk upsert formatted price_data rows, for any mix of tokens, in batches.
+    The caller is responsible for committing.
+    """
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        insert_stmt = pg_insert(PriceData).values(rows[i : i + UPSERT_BATCH_SIZE])
+        insert_stmt = insert_stmt.on_conflict_do_update(
+            index_elements=["token_id", "timestamp"],
+            set_={
+                c.key: c
+                for c in insert_stmt.excluded
+                if c.key in ("open", "close", "high", "low", "price_usd")
+            },
+        )
+        await db_session.execute(insert_stmt)
 
 
 class UniswapSubgraphService:
-    def __init__(self, db_session):
-        self.api_url = UNISWAP_SUBGRAPH_URL
+    def __init__(self, db_session, chain=DEFAULT_CHAIN):
+        # One service per chain, tokens are scoped to their chain and the
+        # subgraph client (HTTP pool and rate limit) is shared per chain
+        self.chain = chain
+        self.client = get_subgraph_client(chain)
+        self.token_addresses = SUBGRAPH_ENDPOINTS[chain]["token_addresses"]
         self.db_session = db_session
 
     async def fetch_token_info(self, token_address):
@@ -32,74 +76,147 @@ class UniswapSubgraphService:
             % token_address
         )
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.api_url, json={"query": query}) as response:
-                data = await response.json()
-                return data["data"]["token"]
+        data = await self.client.query(query)
+        return data["token"]
 
     async def fetch_tokens(self, address_array):
-        address_arrayJSON = json.dumps(address_array)
-        query = (
-            """
-        {
-            tokens(where: 
-                { id_in: %s }
-            ) {
-                id
-                name
-                symbol
-                totalSupply
-                volumeUSD
-                decimals
+        # The subgraph returns 100 records unless told otherwise, so the
+        # address list is paged to avoid silently truncating long lists
+        tokens = []
+        for i in range(0, len(address_array), SUBGRAPH_PAGE_SIZE):
+            address_page = address_array[i : i + SUBGRAPH_PAGE_SIZE]
+            query = """
+            {
+                tokens(first: %d, where:
+                    { id_in: %s }
+                ) {
+                    id
+                    name
+                    symbol
+                    totalSupply
+                    volumeUSD
+                    decimals
+                }
             }
-        }
+            """ % (
+                len(address_page),
+                json.dumps(address_page),
+            )
+
+            data = await self.client.query(query)
+            tokens.extend(data["tokens"])
+
+        return tokens
+
+    async def fetch_top_tokens(self, limit):
         """
-            % address_arrayJSON
-        )
+        Page through the subgraph tokens ranked by volumeUSD.
+
+        Pages are keyed on the last volume seen (volumeUSD_lte) rather than
+        skip, which the subgraph caps at 5000. Tokens tied on the cursor
+        volume are returned again by the next page and deduplicated here.
+        """
+        tokens = {}
+        cursor = None
+        while len(tokens) < limit:
+            where = '{ volumeUSD_lte: "%s" }' % cursor if cursor else "{}"
+            query = """
+            {
+                tokens(
+                    first: %d
+                    orderBy: volumeUSD
+                    orderDirection: desc
+                    where: %s
+                ) {
+                    id
+                    name
+                    symbol
+                    totalSupply
+                    volumeUSD
+                    decimals
+                }
+            }
+            """ % (
+                SUBGRAPH_PAGE_SIZE,
+                where,
+            )
+
+            data = await self.client.query(query)
+            page = data["tokens"]
+
+            new_tokens = [token for token in page if token["id"] not in tokens]
+            for token in new_tokens[: limit - len(tokens)]:
+                tokens[token["id"]] = token
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.api_url, json={"query": query}) as response:
-                data = await response.json()
-                return data["data"]["tokens"]
+            # Stop at the end of the list, or if a whole page is tied on
+            # one volume and the cursor can no longer advance
+            if len(page) < SUBGRAPH_PAGE_SIZE or not new_tokens:
+                break
+            cursor = page[-1]["volumeUSD"]
 
-    async def fetch_price_data(self, token_address, start_timestamp):
+        return list(tokens.values())
+
+    async def fetch_price_data(self, token_address, start_timestamp, end_timestamp=None):
+        price_data = []
+        async for page in self.fetch_price_data_pages(
+            token_address, start_timestamp, end_timestamp
+        ):
+            price_data.extend(page)
+        return price_data
+
+    async def fetch_price_data_pages(
+        self, token_address, start_timestamp, end_timestamp=None
+    ):
         logging.debug(
-            "Fetching price data for token %s starting from %s",
+            "Fetching price data for token %s from %s to %s",
             token_address,
             start_timestamp,
+            end_timestamp,
         )
-        query = """
-        {
-            tokenHourDatas(
-                orderBy: periodStartUnix
-                orderDirection: desc
-                where: {token: "%s", periodStartUnix_gte: %d}
-            ) {
-                low
-                open
-                high
-                close
-                priceUSD
-                periodStartUnix
-                id
+        # Page forward through the hours with a periodStartUnix cursor,
+        # a single query is capped at SUBGRAPH_PAGE_SIZE records
+        cursor = start_timestamp
+        while True:
+            where = 'token: "%s", periodStartUnix_gte: %d' % (token_address, cursor)
+            if end_timestamp is not None:
+                where += ", periodStartUnix_lt: %d" % end_timestamp
+            query = """
+            {
+                tokenHourDatas(
+                    first: %d
+                    orderBy: periodStartUnix
+                    orderDirection: asc
+                    where: {%s}
+                ) {
+                    low
+                    open
+                    high
+                    close
+                    priceUSD
+                    periodStartUnix
+                    id
+                }
             }
-        }
-        """ % (
-            token_address,
-            start_timestamp,
-        )
+            """ % (
+                SUBGRAPH_PAGE_SIZE,
+                where,
+            )
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.api_url, json={"query": query}) as response:
-                data = await response.json()
-                return data["data"]["tokenHourDatas"]
+            data = await self.client.query(query)
+            page = data["tokenHourDatas"]
+
+            if page:
+                yield page
+            if len(page) < SUBGRAPH_PAGE_SIZE:
+                return
+            cursor = page[-1]["periodStartUnix"] + 1
 
     async def update_token_info(self, token_address):
         token_info = await self.fetch_token_info(token_address)
 
         # Check if token exists
         existing_token = await self.db_session.execute(
-            select(Token).filter_by(address=token_address)
+            select(Token).filter_by(chain=self.chain, address=token_address)
         )
         existing_token = existing_token.scalar_one_or_none()
 
@@ -107,23 +224,26 @@ class UniswapSubgraphService:
             # Update existing token
             await self.db_session.execute(
                 update(Token)
-                .where(Token.address == token_address)
+                .where(Token.chain == self.chain, Token.address == token_address)
                 .values(**self.format_token_data(token_info))
             )
         else:
             # Insert new token
             await self.db_session.execute(
                 insert(Token).values(
-                    **self.format_token_data(token_info, token_address)
+                    chain=self.chain,
+                    **self.format_token_data(token_info, token_address),
                 )
             )
 
         await self.db_session.commit()
 
     def format_token_data(self, token_info, token_address=None):
+        # Trim to the tokens table column sizes,
+        # subgraph symbols and names are unbounded
         formatted_data = {
-            "name": token_info["name"],
-            "symbol": token_info["symbol"],
+            "name": token_info["name"][:100],
+            "symbol": token_info["symbol"][:10],
             "total_supply": token_info["totalSupply"],
             "volume_usd": token_info["volumeUSD"],
             "decimals": int(token_info["decimals"]),
@@ -136,9 +256,124 @@ class UniswapSubgraphService:
         # (else None values will be inserted into the database as null)
         return {k: v for k, v in formatted_data.items() if v is not None}
 
+    async def upsert_tokens(self, formatted_tokens, update_columns=None):
+        """
+        Bulk upsert formatted token rows for this chain in batches,
+        marking them active.
+        update_columns limits which columns are updated on existing tokens,
+        by default every column except the id.
+
+        Returns a map of token address to the postgres token id. The caller
+        is responsible for committing.
+        """
+        token_id_map = {}
+        for i in range(0, len(formatted_tokens), UPSERT_BATCH_SIZE):
+            batch = [
+                dict(token, chain=self.chain, active=True)
+                for token in formatted_tokens[i : i + UPSERT_BATCH_SIZE]
+            ]
+            insert_stmt = pg_insert(Token).values(batch)
+            # Upsert on conflict if token address already exists on the chain
+            # Update all fields except for the id, unless told otherwise
+            insert_stmt = insert_stmt.on_conflict_do_update(
+                index_elements=["chain", "address"],
+                set_={
+                    c.key: c
+                    for c in insert_stmt.excluded
+                    if c.key != "id"
+                    and (update_columns is None or c.key in update_columns)
+                },
+            )
+            # Return the id and address of the inserted tokens
+            insert_stmt = insert_stmt.returning(Token.id, Token.address)
+            result = await self.db_session.execute(insert_stmt)
+            token_id_map.update({token.address: token.id for token in result})
+
+        return token_id_map
+
+    async def discover_tokens(self, limit, pinned_addresses=()):
+        """
+        Refresh the tracked token universe to the top `limit` tokens by
+        volumeUSD, plus any pinned addresses.
+
+        Tokens that fall out of the set are retired (active = false), their
+        price history is kept but they are no longer polled.
+        """
+        logging.info("Discovering top %s %s tokens by volumeUSD", limit, self.chain)
+        top_tokens = await self.fetch_top_tokens(limit)
+        top_addresses = {token["id"] for token in top_tokens}
+        missing_pinned = [
+            address for address in pinned_addresses if address not in top_addresses
+        ]
+        subgraph_tokens = await self.fetch_tokens(missing_pinned) + top_tokens
+
+        # Symbols are unique in the tokens table and the subgraph has plenty of
+        # duplicates. Tracked tokens keep their symbols, after that the first
+        # (pinned, then highest volume) token takes a symbol
+        existing_tokens = (
+            await self.db_session.execute(
+                select(Token.id, Token.address, Token.symbol, Token.active).filter_by(
+                    chain=self.chain
+                )
+            )
+        ).all()
+        symbol_owner = {
+            token.symbol: token.address for token in existing_tokens if token.active
+        }
+        formatted_tokens = []
+        for token in subgraph_tokens:
+            formatted_token = self.format_token_data(token, token["id"])
+            owner = symbol_owner.setdefault(
+                formatted_token["symbol"], formatted_token["address"]
+            )
+            if owner != formatted_token["address"]:
+                logging.info(
+                    "Skipping %s token %s, symbol %s is taken by %s",
+                    self.chain,
+                    formatted_token["address"],
+                    formatted_token["symbol"],
+                    owner,
+                )
+                continue
+            formatted_tokens.append(formatted_token)
+
+        # Retired tokens give up a symbol another token now takes and are
+        # renamed to their address prefix, the routes also find them by
+        # address and /tokens?include_retired=true lists them
+        for token in existing_tokens:
+            if (
+                not token.active
+                and symbol_owner.get(token.symbol, token.address) != token.address
+            ):
+                await self.db_session.execute(
+                    update(Token)
+                    .where(Token.id == token.id)
+                    .values(symbol=token.address[:10])
+                )
+
+        token_id_map = await self.upsert_tokens(formatted_tokens)
+        # Retire tokens that are no longer in the tracked set, unless the
+        # subgraph returned nothing, which would retire the whole chain
+        if top_tokens:
+            await self.db_session.execute(
+                update(Token)
+                .where(
+                    Token.chain == self.chain,
+                    Token.id.not_in(list(token_id_map.values())),
+                )
+                .values(active=False)
+            )
+        else:
+            logging.warning(
+                "No %s tokens discovered, keeping the current token set", self.chain
+            )
+        await self.db_session.commit()
+        logging.info("Tracking %s %s tokens", len(token_id_map), self.chain)
+        return token_id_map
+
     async def get_token_id(self, token_address):
         token = await self.db_session.execute(
-            select(Token).filter_by(address=token_address)
+            select(Token).filter_by(chain=self.chain, address=token_address)
         )
         token = token.scalar_one_or_none()
 
@@ -168,41 +403,116 @@ class UniswapSubgraphService:
         token_address = token_address.scalar_one_or_none().address
         price_data = await self.fetch_price_data(token_address, start_timestamp)
 
-        for data in price_data:
-            timestamp = datetime.fromtimestamp(data["periodStartUnix"])
-            await self.db_session.execute(
-                pg_insert(PriceData)
-                .values(
-                    token_id=token_id,
-                    timestamp=timestamp,
-                    open=data["open"],
-                    close=data["close"],
-                    high=data["high"],
-                    low=data["low"],
-                    price_usd=data["priceUSD"],
-                )
-                .on_conflict_do_update(
-                    index_elements=["token_id", "timestamp"],
-                    set_=dict(
-                        open=data["open"],
-                        close=data["close"],
-                        high=data["high"],
-                        low=data["low"],
-                        price_usd=data["priceUSD"],
-                    ),
-                )
-            )
+        await self.upsert_price_data(token_id, price_data)
+        await self.db_session.commit()
+
+    def format_price_data(self, token_id, price_data):
+        return [
+            {
+                "token_id": token_id,
+                "timestamp": datetime.fromtimestamp(data["periodStartUnix"]),
+                "open": data["open"],
+                "close": data["close"],
+                "high": data["high"],
+                "low": data["low"],
+                "price_usd": data["priceUSD"],
+            }
+            for data in price_data
+        ]
+
+    async def upsert_price_data(self, token_id, price_data):
+        """
+        Bulk upsert subgraph tokenHourDatas for a token in batches.
+        The caller is responsible for committing.
+        """
+        await upsert_price_rows(
+            self.db_session, self.format_price_data(token_id, price_data)
+        )
+
+    async def get_latest_timestamps(self, token_ids):
+        # One grouped query for the newest stored hour of every token
+        result = await self.db_session.execute(
+            select(PriceData.token_id, func.max(PriceData.timestamp))
+            .filter(PriceData.token_id.in_(token_ids))
+            .group_by(PriceData.token_id)
+        )
+        return {token_id: timestamp for token_id, timestamp in result}
 
+    async def ingest_price_data(self, tokens):
+        """
+        Fetch and store new price data for many tokens through the
+        fetch/write pipeline, see services/ingest_pipeline.py.
+        """
+        latest_timestamps = await self.get_latest_timestamps(
+            [token.id for token in tokens]
+        )
+        # If no data, fetch last 10 days
+        default_start = int((datetime.now() - timedelta(days=10)).timestamp())
+        jobs = []
+        for token in tokens:
+            start = (
+                int(latest_timestamps[token.id].timestamp())
+                if token.id in latest_timestamps
+                else default_start
+            )
+            if token.id in pending_refetch:
+                start = min(start, int(pending_refetch[token.id].timestamp()))
+            jobs.append((token.id, token.address, start))
+        # End the read transaction so the session holds no connection
+        # while the pipeline runs on its own writer sessions
         await self.db_session.commit()
+        pipeline = IngestPipeline(
+            name=self.chain,
+            fetch_pages=self.fetch_price_data_pages,
+            format_rows=self.format_price_data,
+            write_rows=upsert_price_rows,
+            # New candles update cached indicators incrementally
+            on_commit=indicator_cache.on_price_rows,
+        )
+        await pipeline.run(jobs)
+        # Kept until a cycle writes every batch of the token
+        for token in tokens:
+            pending_refetch.pop(token.id, None)
+        pending_refetch.update(pipeline.failed_from)
+        # Cross-token results are only valid until new data is committed
+        correlation_cache.clear()
 
     async def update_all_data(self):
-        # Fetch all tokens
-        tokens = await self.db_session.execute(select(Token))
+        # Fetch all tracked tokens
+        tokens = await self.db_session.execute(
+            select(Token).filter_by(chain=self.chain, active=True)
+        )
         tokens = tokens.scalars().all()
 
-        for token in tokens:
-            await self.update_token_info(token.id)
-            await self.update_price_data(token.id)
+        # Metadata for all tokens in a few batched queries,
+        # then prices through the ingest pipeline
+        await self.refresh_token_metadata([token.address for token in tokens])
+        await self.ingest_price_data(tokens)
+
+    async def refresh_token_metadata(self, address_array=None):
+        """
+        Refresh totalSupply and volumeUSD for the tracked tokens with paged
+        id_in queries, applied as one bulk upsert per batch.
+        """
+        if address_array is None:
+            addresses = await self.db_session.execute(
+                select(Token.address).filter_by(chain=self.chain, active=True)
+            )
+            address_array = addresses.scalars().all()
+        if not address_array:
+            return
+
+        subgraph_tokens = await self.fetch_tokens(address_array)
+        formatted_tokens = [
+            self.format_token_data(token, token["id"]) for token in subgraph_tokens
+        ]
+        await self.upsert_tokens(
+            formatted_tokens, update_columns=("total_supply", "volume_usd")
+        )
+        await self.db_session.commit()
+        logging.info(
+            "Refreshed metadata for %s %s tokens", len(formatted_tokens), self.chain
+        )
 
     """
         This function was refactored a couple times in an attempt to 
@@ -229,41 +539,73 @@ class UniswapSubgraphService:
         ]
         logging.debug("Formatted token data: %s", formatted_tokens)
         # Execute bulk insert and save generated ids
-        insert_stmt = pg_insert(Token).values(formatted_tokens)
-        # Upsert on conflict if token address already exists
-        # Update all fields except for the id
-        insert_stmt = insert_stmt.on_conflict_do_update(
-            index_elements=["address"],
-            set_={c.key: c for c in insert_stmt.excluded if c.key != "id"},
-        )
-        # Return the id and address of the inserted tokens
-        insert_stmt = insert_stmt.returning(Token.id, Token.address)
-        # Execute the insert statement
-        result = await self.db_session.execute(insert_stmt)
-        # Keep track of inserted tokens for generated ids
-        inserted_tokens = result.fetchall()
+        token_id_map = await self.upsert_tokens(formatted_tokens)
         # commit only once on bulk insert
         await self.db_session.commit()
-        # Map token address to token id
-        token_id_map = {token.address: token.id for token in inserted_tokens}
-        # For each token, fetch and insert price data
+        # Fetch and insert price data for every token
         # Use the subgraph token id to get the postgres token record id
-        for token in subgraph_tokens:
-            token_id = token_id_map[
-                token["id"]
-            ]  # token address from the subgraph response
-            await self.update_price_data(token_id)
+        tokens = await self.db_session.execute(
+            select(Token).filter(Token.id.in_(list(token_id_map.values())))
+        )
+        await self.ingest_price_data(tokens.scalars().all())
 
     async def update_chart_data(self):
-        # Fetch all tokens
-        tokens = await self.db_session.execute(select(Token))
+        # Fetch all tracked tokens
+        tokens = await self.db_session.execute(
+            select(Token).filter_by(chain=self.chain, active=True)
+        )
         tokens = tokens.scalars().all()
 
-        for token in tokens:
-            await self.update_price_data(token.id)
+        await self.ingest_price_data(tokens)
 
     async def start_polling(self, interval_seconds=300):
-        logging.info("Starting polling with interval %s seconds", interval_seconds)
+        logging.info(
+            "Starting %s polling with interval %s seconds", self.chain, interval_seconds
+        )
+        # The universe is discovered on startup, refresh on a slower cadence
+        last_discovery = time.monotonic()
+        while True:
+            if (
+                TOKEN_DISCOVERY_TOP_N
+                and time.monotonic() - last_discovery >= TOKEN_DISCOVERY_INTERVAL
+            ):
+                try:
+                    await self.discover_tokens(
+                        TOKEN_DISCOVERY_TOP_N, self.token_addresses
+                    )
+                except Exception as e:
+                    # Keep polling the current token set, retry next cycle
+                    logging.error("%s token discovery failed: %s", self.chain, e)
+                    await self.db_session.rollback()
+                else:
+                    last_discovery = time.monotonic()
+            try:
+                await self.update_chart_data()
+            except Exception as e:
+                # One failed cycle must not stop this chain for good
+                logging.error("%s price polling failed: %s", self.chain, e)
+                await self.db_session.rollback()
+            if CHART_SNAPSHOTS_ENABLED:
+                try:
+                    await write_chart_snapshots(self.chain)
+                except Exception as e:
+                    logging.error("%s chart snapshots failed: %s", self.chain, e)
+            await asyncio.sleep(interval_seconds)
+
+    async def start_metadata_polling(self, interval_seconds=3600):
+        logging.info(
+            "Starting %s metadata polling with interval %s seconds",
+            self.chain,
+            interval_seconds,
+        )
         while True:
-            await self.update_chart_data()
+            # Metadata was loaded with the tokens on startup
             await asyncio.sleep(interval_seconds)
+            try:
+                # Runs alongside price polling, which owns self.db_session
+                async with AsyncSessionLocal() as session:
+                    await UniswapSubgraphService(
+                        session, self.chain
+                    ).refresh_token_metadata()
+            except Exception as e:
+                logging.error("%s token metadata refresh failed: %s", self.chain, e)
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from services.backfill import BackfillService, build_windows
+
+
+START = datetime(2024, 1, 1, 0, 0, tzinfo=timezone.utc)
+
+
+def test_build_windows_hour_aligned():
+    windows = build_windows(
+        START.replace(minute=37, second=5), START + timedelta(hours=48), 24
+    )
+    assert windows == [
+        (START, START + timedelta(hours=24)),
+        (START + timedelta(hours=24), START + timedelta(hours=48)),
+    ]
+
+
+def test_build_windows_partial_last_window():
+    windows = build_windows(START, START + timedelta(hours=30), 24)
+    assert windows[-1] == (START + timedelta(hours=24), START + timedelta(hours=30))
+    assert len(windows) == 2
+
+
+def test_build_windows_same_start_same_keys():
+    end = START + timedelta(hours=100)
+    first = build_windows(START.replace(minute=12), end, 24)
+    second = build_windows(START.replace(minute=48), end, 24)
+    assert first == second
+
+
+async def test_run_skips_checkpointed_windows():
+    end = START + timedelta(hours=72)
+    windows = build_windows(START, end, 24)
+    tokens = [
+        SimpleNamespace(id=1, symbol="WBTC", chain="mainnet"),
+        SimpleNamespace(id=2, symbol="GNO", chain="mainnet"),
+    ]
+    # WBTC's first window was written by an earlier, interrupted run
+    checkpointed = {(1, *windows[0])}
+    backfilled = []
+
+    service = BackfillService(concurrency=2, window_hours=24)
+
+    async def get_tokens(symbols=None, chain=None):
+        return tokens
+
+    async def get_completed_windows(token_ids, start_time, end_time):
+        assert (start_time, end_time) == (windows[0][0], windows[-1][1])
+        return checkpointed
+
+    async def backfill_window(token, window_start, window_end):
+        backfilled.append((token.id, window_start, window_end))
+        return 10
+
+    service.get_tokens = get_tokens
+    service.get_completed_windows = get_completed_windows
+    service.backfill_window = backfill_window
+
+    summary = await service.run(START, end)
+    assert summary == {"completed": 5, "skipped": 1, "failed": 0, "rows": 50}
+    assert (1, *windows[0]) not in backfilled
+    assert len(backfilled) == 5
@@ -0,0 +1,137 @@
+import os
+import pytest
+import routes.token
+import services.chart_snapshots as chart_snapshots
+from services.chart_snapshots import (
+    SnapshotReader,
+    serialize_chart_data,
+    snapshot_path,
+    write_atomic,
+    write_token_snapshots,
+)
+
+
+HOUR = 1704067200
+DATA = [[["2024-01-01T00:00:00", "open", 1.5]], [], [], [], []]
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(chart_snapshots, "CHART_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(chart_snapshots, "CHART_SNAPSHOTS_ENABLED", True)
+    monkeypatch.setattr(
+        chart_snapshots, "CHART_SNAPSHOT_WINDOWS", [(24, 1), (168, 4)]
+    )
+    monkeypatch.setattr(chart_snapshots, "snapshot_hour", lambda: HOUR)
+    return tmp_path
+
+
+def write(symbol, payload, hours=24, interval_hours=1):
+    path = snapshot_path("mainnet", symbol, hours, interval_hours, HOUR)
+    write_atomic(path, payload)
+    return path
+
+
+def test_write_atomic_replaces_and_leaves_no_temp_files(tmp_path):
+    path = str(tmp_path / "mainnet" / "WBTC_24_1.json")
+    write_atomic(path, b"first")
+    write_atomic(path, b"second")
+    with open(path, "rb") as f:
+        assert f.read() == b"second"
+    assert os.listdir(tmp_path / "mainnet") == ["WBTC_24_1.json"]
+
+
+def test_write_atomic_keeps_the_old_file_on_failure(tmp_path):
+    path = str(tmp_path / "WBTC_24_1.json")
+    write_atomic(path, b"first")
+    with pytest.raises(TypeError):
+        write_atomic(path, "not bytes")
+    with open(path, "rb") as f:
+        assert f.read() == b"first"
+    assert os.listdir(tmp_path) == ["WBTC_24_1.json"]
+
+
+def test_reader_serves_standard_windows_only(snapshot_dir, monkeypatch):
+    write("WBTC", serialize_chart_data(DATA))
+    reader = SnapshotReader()
+    assert bytes(reader.read("mainnet", "WBTC", 24, 1)) == serialize_chart_data(DATA)
+    # Non-standard window, unknown chain, no snapshot yet
+    assert reader.read("mainnet", "WBTC", 48, 1) is None
+    assert reader.read("../mainnet", "WBTC", 24, 1) is None
+    assert reader.read("mainnet", "GNO", 24, 1) is None
+
+    monkeypatch.setattr(chart_snapshots, "CHART_SNAPSHOTS_ENABLED", False)
+    assert reader.read("mainnet", "WBTC", 24, 1) is None
+
+
+def test_reader_remaps_replaced_files(snapshot_dir):
+    write("WBTC", b"[1]")
+    reader = SnapshotReader()
+    assert bytes(reader.read("mainnet", "WBTC", 24, 1)) == b"[1]"
+    # A new inode
+    write("WBTC", b"[1,2]")
+    assert bytes(reader.read("mainnet", "WBTC", 24, 1)) == b"[1,2]"
+
+
+def test_reader_remaps_on_mtime_change(snapshot_dir):
+    path = write("WBTC", b"[1]")
+    reader = SnapshotReader()
+    reader.read("mainnet", "WBTC", 24, 1)
+    ((key, mapped),) = reader._maps.values()
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    reader.read("mainnet", "WBTC", 24, 1)
+    ((new_key, new_mapped),) = reader._maps.values()
+    assert new_key != key and new_mapped is not mapped
+
+    # Unchanged files reuse the mapping
+    reader.read("mainnet", "WBTC", 24, 1)
+    assert next(iter(reader._maps.values()))[1] is new_mapped
+
+
+def test_reader_evicts_least_recently_used_maps(snapshot_dir):
+    write("WBTC", b"[1]")
+    write("GNO", b"[2]")
+    reader = SnapshotReader(max_maps=1)
+    reader.read("mainnet", "WBTC", 24, 1)
+    view = reader.read("mainnet", "GNO", 24, 1)
+    assert len(reader._maps) == 1
+    assert bytes(view) == b"[2]"
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+async def test_write_token_snapshots(snapshot_dir, monkeypatch):
+    async def query_chart_data(db, symbol, hours, interval_hours, chain):
+        return DATA
+
+    monkeypatch.setattr(routes.token, "query_chart_data", query_chart_data)
+    monkeypatch.setattr(chart_snapshots, "AsyncSessionLocal", FakeSession)
+
+    assert await write_token_snapshots("mainnet", "WBTC", HOUR)
+    assert sorted(os.listdir(snapshot_dir / "mainnet" / str(HOUR))) == [
+        "WBTC_168_4.json",
+        "WBTC_24_1.json",
+    ]
+
+
+async def test_write_token_snapshots_stops_when_the_hour_turns(
+    snapshot_dir, monkeypatch
+):
+    async def query_chart_data(db, symbol, hours, interval_hours, chain):
+        # The hour turns while the first window is being queried
+        monkeypatch.setattr(chart_snapshots, "snapshot_hour", lambda: HOUR + 3600)
+        return DATA
+
+    monkeypatch.setattr(routes.token, "query_chart_data", query_chart_data)
+    monkeypatch.setattr(chart_snapshots, "AsyncSessionLocal", FakeSession)
+
+    assert not await write_token_snapshots("mainnet", "WBTC", HOUR)
+    assert not os.path.exists(snapshot_dir / "mainnet" / str(HOUR))
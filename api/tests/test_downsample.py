@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import numpy as np
+from routes.token import downsample_chart_data
+from utils.downsample import fill_gaps, lttb, min_max
+
+
+def random_walk(n, seed=7):
+    rng = np.random.default_rng(seed)
+    x = np.arange(n, dtype=np.float64) * 3600
+    return x, 100 + np.cumsum(rng.normal(size=n))
+
+
+def test_lttb_bounds_sorts_and_keeps_endpoints():
+    x, y = random_walk(1000)
+    for n_out in (3, 10, 99, 500):
+        keep = lttb(x, y, n_out)
+        assert len(keep) == n_out
+        assert np.all(np.diff(keep) > 0)
+        assert keep[0] == 0 and keep[-1] == len(y) - 1
+
+
+def test_lttb_keeps_a_spike():
+    x, y = random_walk(1000)
+    y[437] = 1e6
+    assert 437 in lttb(x, y, 50)
+
+
+def test_min_max_bounds_sorts_and_keeps_extremes():
+    x, y = random_walk(1000)
+    for n_out in (2, 11, 100):
+        keep = min_max(x, y, n_out)
+        assert len(keep) <= n_out
+        assert np.all(np.diff(keep) > 0)
+        assert np.argmin(y) in keep and np.argmax(y) in keep
+
+
+def test_short_series_returned_whole():
+    x, y = random_walk(20)
+    assert list(lttb(x, y, 20)) == list(range(20))
+    assert list(min_max(x, y, 50)) == list(range(20))
+
+
+def test_fill_gaps():
+    filled = fill_gaps([np.nan, np.nan, 2.0, np.nan, 5.0, np.nan])
+    assert list(filled) == [2.0, 2.0, 2.0, 2.0, 5.0, 5.0]
+    assert list(fill_gaps([np.nan, np.nan])) == [0.0, 0.0]
+
+
+def candles(n):
+    start = datetime(2024, 1, 1)
+    _, prices = random_walk(n)
+    rows = []
+    for i, price in enumerate(prices):
+        # Hours before the first known price are null
+        value = None if i < 5 else float(price)
+        rows.append(
+            SimpleNamespace(
+                interval_timestamp=start + timedelta(hours=i),
+                open=value,
+                close=value,
+                high=None if value is None else value + 1,
+                low=None if value is None else value - 1,
+                price_usd=value,
+            )
+        )
+    return rows
+
+
+def test_downsampled_series_share_timestamps():
+    rows = candles(500)
+    for method in ("lttb", "minmax"):
+        data = downsample_chart_data(rows, 40, method)
+        assert len(data) == 5
+        assert 0 < len(data[0]) <= 40
+        timestamps = [[point[0] for point in series] for series in data]
+        assert all(series == timestamps[0] for series in timestamps)
+        assert timestamps[0] == sorted(timestamps[0])
+        # Every kept timestamp has a full candle
+        for open_, close, high, low, price in zip(*data):
+            if price[2] is not None:
+                assert low[2] <= open_[2] <= high[2]
+                assert low[2] <= close[2] <= high[2]
+
+
+def test_downsampling_keeps_null_points():
+    data = downsample_chart_data(candles(500), 40, "lttb")
+    # The first row is always kept, and stays null as it would unsampled
+    assert data[0][0] == ["2024-01-01T00:00:00", "open", None]
@@ -0,0 +1,87 @@
+import math
+from datetime import datetime, timezone
+import numpy as np
+import pytest
+from services.indicators import IndicatorCache, IndicatorSeries, make_indicator
+
+
+INDICATORS = [
+    ("sma", 20),
+    ("ema", 20),
+    ("rsi", 14),
+    ("bollinger", 20),
+    ("volatility", 24),
+]
+
+
+def closes_series(n, seed=3):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(scale=0.01, size=n)))
+
+
+def incremental(indicator, closes, initial):
+    timestamps = np.arange(len(closes)) * 3600.0
+    series = IndicatorSeries(
+        indicator, timestamps[:initial], closes[:initial], max_length=10_000
+    )
+    for timestamp, close in zip(timestamps[initial:], closes[initial:]):
+        assert series.add(timestamp, close)
+    return series
+
+
+@pytest.mark.parametrize("name,period", INDICATORS)
+@pytest.mark.parametrize("initial", [1, 10, 100])
+def test_incremental_add_matches_compute(name, period, initial):
+    indicator = make_indicator(name, period)
+    closes = closes_series(500)
+    outputs, _ = indicator.compute(closes)
+    series = incremental(indicator, closes, initial)
+    for expected, actual in zip(outputs, series.outputs):
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("name,period", INDICATORS)
+def test_revising_the_latest_close_matches_compute(name, period):
+    indicator = make_indicator(name, period)
+    closes = closes_series(200)
+    series = incremental(indicator, closes, 50)
+    # The latest hour is updated again with a different close
+    closes[-1] *= 1.05
+    assert series.add(199 * 3600.0, closes[-1])
+    outputs, _ = indicator.compute(closes)
+    for expected, actual in zip(outputs, series.outputs):
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9)
+
+
+def test_volatility_zero_close_matches_compute():
+    indicator = make_indicator("volatility", 24)
+    closes = closes_series(200)
+    closes[120] = 0.0
+    outputs, _ = indicator.compute(closes)
+    series = incremental(indicator, closes, 50)
+
+    (expected,), (actual,) = outputs, series.outputs
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9)
+    # Windows over the zero close have no value, later ones recover
+    assert math.isnan(actual[130])
+    assert not math.isnan(actual[-1])
+
+
+def test_on_price_rows_drops_series_that_fail_to_update():
+    class Broken:
+        def add(self, timestamp, close):
+            raise ValueError("math domain error")
+
+    cache = IndicatorCache()
+    cache.entries[(1, ("volatility", 24))] = Broken()
+    cache.entries[(2, ("sma", 20))] = IndicatorSeries(
+        make_indicator("sma", 20), [0.0], [1.0], max_length=100
+    )
+    timestamp = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    cache.on_price_rows(
+        [
+            {"token_id": 1, "timestamp": timestamp, "close": "0"},
+            {"token_id": 2, "timestamp": timestamp, "close": "2"},
+        ]
+    )
+    assert list(cache.entries) == [(2, ("sma", 20))]
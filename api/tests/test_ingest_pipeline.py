@@ -0,0 +1,176 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from services.ingest_pipeline import IngestPipeline
+
+
+START = datetime(2024, 1, 1)
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+def make_fetch_pages(pages_per_token, failing_addresses=()):
+    # Two hourly rows per page
+    async def fetch_pages(address, start_timestamp):
+        for page in range(pages_per_token):
+            if address in failing_addresses and page == 1:
+                raise KeyError("data")
+            yield [
+                START + timedelta(hours=2 * page),
+                START + timedelta(hours=2 * page + 1),
+            ]
+
+    return fetch_pages
+
+
+def format_rows(token_id, page):
+    return [{"token_id": token_id, "timestamp": timestamp} for timestamp in page]
+
+
+def make_pipeline(fetch_pages, write_rows, **kwargs):
+    return IngestPipeline(
+        "test",
+        fetch_pages,
+        format_rows,
+        write_rows,
+        session_factory=FakeSession,
+        **kwargs,
+    )
+
+
+async def test_pipeline_backpressure():
+    release = asyncio.Event()
+    written = []
+
+    async def write_rows(session, rows):
+        await release.wait()
+        written.extend(rows)
+
+    pipeline = make_pipeline(
+        make_fetch_pages(10), write_rows, queue_size=2, writers=1, write_batch_rows=2
+    )
+    run = asyncio.create_task(pipeline.run([(1, "0x1", 0), (2, "0x2", 0)]))
+    await asyncio.sleep(0.05)
+
+    # One page held by the blocked writer, two queued and each fetcher
+    # blocked putting one more
+    assert pipeline.queue.qsize() == 2
+    assert pipeline.counters["fetch_pages"] == 1 + 2 + 2
+    assert not run.done()
+
+    release.set()
+    await asyncio.wait_for(run, 5)
+    assert len(written) == 40
+    assert pipeline.counters["queue_high_water"] <= 2
+
+
+async def test_pipeline_end_markers_stop_every_writer():
+    written = []
+
+    async def write_rows(session, rows):
+        written.extend(rows)
+
+    pipeline = make_pipeline(
+        make_fetch_pages(3), write_rows, writers=4, fetch_concurrency=2
+    )
+    await asyncio.wait_for(pipeline.run([(1, "0x1", 0), (2, "0x2", 0)]), 5)
+
+    assert len(written) == 12
+    assert pipeline.queue.empty()
+    stats = pipeline.stats()
+    assert stats["running"] is False
+    assert stats["fetch"]["pages"] == 6
+    assert stats["fetch"]["rows"] == 12
+    assert stats["write"]["rows"] == 12
+    assert stats["write"]["rows_per_second"] > 0
+
+
+async def test_pipeline_retries_and_records_failed_batches():
+    attempts = {}
+
+    async def write_rows(session, rows):
+        key = (rows[0]["token_id"], rows[0]["timestamp"])
+        attempts[key] = attempts.get(key, 0) + 1
+        # Token 1's first page fails once, token 2's second page always fails
+        if key == (1, START) and attempts[key] == 1:
+            raise ConnectionError("connection reset")
+        if key == (2, START + timedelta(hours=2)):
+            raise ConnectionError("deadlock detected")
+
+    pipeline = make_pipeline(
+        make_fetch_pages(3, failing_addresses={"0x3"}),
+        write_rows,
+        writers=1,
+        write_batch_rows=2,
+        write_retries=1,
+    )
+    await asyncio.wait_for(
+        pipeline.run([(1, "0x1", 0), (2, "0x2", 0), (3, "0x3", 0)]), 5
+    )
+
+    stats = pipeline.stats()
+    assert stats["fetch"]["errors"] == 1
+    assert stats["write"]["retries"] == 2
+    assert stats["write"]["errors"] == 1
+    # Token 1 after its retry, token 2 without the dropped page, token 3's
+    # first page before its fetch failed
+    assert stats["write"]["rows"] == 6 + 4 + 2
+    assert pipeline.failed_from == {2: START + timedelta(hours=2)}
+    assert stats["write"]["tokens_to_refetch"] == 1
+
+
+async def test_pipeline_survives_failing_on_commit():
+    written = []
+
+    async def write_rows(session, rows):
+        written.extend(rows)
+
+    def on_commit(rows):
+        raise ValueError("math domain error")
+
+    pipeline = make_pipeline(
+        make_fetch_pages(10),
+        write_rows,
+        queue_size=2,
+        writers=1,
+        write_batch_rows=2,
+        on_commit=on_commit,
+    )
+    await asyncio.wait_for(pipeline.run([(1, "0x1", 0), (2, "0x2", 0)]), 3)
+
+    assert len(written) == 40
+    stats = pipeline.stats()
+    assert stats["write"]["on_commit_errors"] == stats["write"]["batches"] == 20
+
+
+async def test_pipeline_fails_fast_when_writers_stop():
+    class BrokenSession(FakeSession):
+        async def __aenter__(self):
+            raise ConnectionError("too many connections")
+
+    async def write_rows(session, rows):
+        pass
+
+    pipeline = IngestPipeline(
+        "test",
+        make_fetch_pages(10),
+        format_rows,
+        write_rows,
+        queue_size=2,
+        writers=1,
+        session_factory=BrokenSession,
+    )
+    with pytest.raises(ConnectionError):
+        await asyncio.wait_for(pipeline.run([(1, "0x1", 0), (2, "0x2", 0)]), 3)
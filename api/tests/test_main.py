@@ -9,3 +9,14 @@ async def test_read_main():
         response = await ac.get("/")
     assert response.status_code == 200
     assert response.json() == {"message": "Welcome to Uniswap V3 Data API"}
+
+
+async def test_db_pool_stats():
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        response = await ac.get("/api/debug/db-pool-stats")
+    respJSON = response.json()
+    assert response.status_code == 200
+    assert "primary" in respJSON
+    assert respJSON["primary"]["checked_out"] >= 0
@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from starlette.responses import Response
+import services.query_profiler as query_profiler_module
+from services.query_profiler import QueryProfiler
+from services.request_profiler import RequestProfiler
+
+
+CHART_QUERY = "WITH time_series AS (SELECT generate_series(...)) SELECT 1"
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    monkeypatch.setattr(query_profiler_module, "SLOW_QUERY_THRESHOLD_MS", 100)
+    monkeypatch.setattr(query_profiler_module, "SLOW_QUERY_LOG_SIZE", 3)
+    monkeypatch.setattr(query_profiler_module, "EXPLAIN_THRESHOLD_MS", 500)
+    monkeypatch.setattr(query_profiler_module, "EXPLAIN_COOLDOWN_SECONDS", 60)
+    profiler = QueryProfiler()
+    profiler.explained = []
+
+    async def capture_explain(async_engine, engine_name, statement, parameters, entry):
+        profiler.explained.append(statement)
+
+    profiler.capture_explain = capture_explain
+    return profiler
+
+
+def record(profiler, statement, duration_ms):
+    profiler.record(None, "primary", statement, {}, duration_ms / 1000)
+
+
+def test_fast_statements_are_only_counted(profiler):
+    record(profiler, "SELECT 1", 5)
+    stats = profiler.stats()
+    assert stats["statements"] == 1
+    assert stats["slowest"] == stats["recent_slow"] == []
+
+
+def test_slowest_heap_evicts_the_fastest(profiler):
+    for duration_ms in (150, 400, 120, 300, 200):
+        record(profiler, f"SELECT {duration_ms}", duration_ms)
+    stats = profiler.stats()
+    assert [e["duration_ms"] for e in stats["slowest"]] == [400, 300, 200]
+    # The ring buffer keeps the latest slow statements in arrival order
+    assert [e["duration_ms"] for e in stats["recent_slow"]] == [120, 300, 200]
+
+
+async def test_explain_needs_a_marker_and_the_threshold(profiler):
+    record(profiler, "SELECT * FROM tokens", 900)
+    record(profiler, CHART_QUERY, 300)
+    record(profiler, "EXPLAIN (ANALYZE, BUFFERS) " + CHART_QUERY, 900)
+    await asyncio.sleep(0)
+    assert profiler.explained == []
+
+    record(profiler, CHART_QUERY, 900)
+    await asyncio.sleep(0)
+    assert profiler.explained == [CHART_QUERY]
+
+
+async def test_explain_cooldown_per_marker(profiler):
+    record(profiler, CHART_QUERY, 900)
+    record(profiler, CHART_QUERY, 900)
+    await asyncio.sleep(0)
+    assert len(profiler.explained) == 1
+
+    # Once the cooldown has passed the marker is explained again
+    profiler.last_explain = {
+        marker: seen - 61 for marker, seen in profiler.last_explain.items()
+    }
+    record(profiler, CHART_QUERY, 900)
+    await asyncio.sleep(0)
+    assert len(profiler.explained) == 2
+    # Finished captures are released
+    await asyncio.sleep(0)
+    assert profiler.tasks == set()
+
+
+async def test_request_profiler_keeps_reports():
+    request_profiler = RequestProfiler(max_profiles=2)
+
+    async def call_next(request):
+        await asyncio.sleep(0)
+        return Response("ok")
+
+    ids = []
+    for path in ("/api/tokens", "/api/chart-data/WBTC", "/api/correlations"):
+        request = SimpleNamespace(
+            method="GET", url=SimpleNamespace(path=path, query="hours=24")
+        )
+        response = await request_profiler.profile(request, call_next)
+        ids.append(int(response.headers["X-Profile-Id"]))
+
+    assert ids == [1, 2, 3]
+    # The oldest profile was dropped
+    assert request_profiler.get(1) is None
+    assert request_profiler.get(3)["path"] == "/api/correlations"
+    assert request_profiler.get(3)["report"]
+    summaries = request_profiler.summaries()
+    assert [s["id"] for s in summaries] == [2, 3]
+    assert all("report" not in s for s in summaries)
@@ -0,0 +1,87 @@
+import asyncio
+import pytest
+from utils.single_flight import SingleFlight
+
+
+async def test_concurrent_calls_share_one_result():
+    flight = SingleFlight("test")
+    release = asyncio.Event()
+    executions = 0
+
+    async def query():
+        nonlocal executions
+        executions += 1
+        await release.wait()
+        return {"rows": [1, 2, 3]}
+
+    calls = [asyncio.create_task(flight.do("WBTC", query)) for _ in range(50)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*calls)
+
+    assert executions == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {
+        "calls": 50,
+        "executions": 1,
+        "coalesced": 49,
+        "in_flight": 0,
+    }
+
+
+async def test_concurrent_calls_share_one_exception():
+    flight = SingleFlight("test")
+    release = asyncio.Event()
+
+    async def query():
+        await release.wait()
+        raise ValueError("query failed")
+
+    calls = [asyncio.create_task(flight.do("WBTC", query)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*calls, return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert all(result is results[0] for result in results)
+    assert flight.stats()["executions"] == 1
+
+
+async def test_key_released_after_completion():
+    flight = SingleFlight("test")
+    executions = 0
+
+    async def query():
+        nonlocal executions
+        executions += 1
+        return executions
+
+    assert await flight.do("WBTC", query) == 1
+    assert flight.in_flight == {}
+    assert await flight.do("WBTC", query) == 2
+    # Different keys never coalesce
+    assert await flight.do("GNO", query) == 3
+    assert flight.stats()["coalesced"] == 0
+
+
+async def test_cancelled_waiter_does_not_cancel_shared_task():
+    flight = SingleFlight("test")
+    release = asyncio.Event()
+
+    async def query():
+        await release.wait()
+        return "done"
+
+    first = asyncio.create_task(flight.do("WBTC", query))
+    second = asyncio.create_task(flight.do("WBTC", query))
+    await asyncio.sleep(0)
+
+    # First client disconnects
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    release.set()
+    assert await second == "done"
+    assert flight.stats()["executions"] == 1
+    assert flight.in_flight == {}
@@ -0,0 +1,163 @@
+import re
+from types import SimpleNamespace
+from sqlalchemy.dialects import postgresql
+import services.uniswap_subgraph as uniswap_subgraph
+from services.uniswap_subgraph import UniswapSubgraphService
+
+
+def subgraph_token(address, symbol, volume=0):
+    return {
+        "id": address,
+        "name": symbol,
+        "symbol": symbol,
+        "totalSupply": "1",
+        "volumeUSD": str(volume),
+        "decimals": "18",
+    }
+
+
+class FakeClient:
+    """Serves tokens ranked by volumeUSD, honouring first and volumeUSD_lte."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.queries = 0
+
+    async def query(self, query):
+        self.queries += 1
+        first = int(re.search(r"first: (\d+)", query).group(1))
+        cursor = re.search(r'volumeUSD_lte: "([^"]+)"', query)
+        tokens = [
+            token
+            for token in self.tokens
+            if cursor is None or float(token["volumeUSD"]) <= float(cursor.group(1))
+        ]
+        return {"tokens": tokens[:first]}
+
+
+class FakeSession:
+    """Returns the given token rows for selects and records every statement."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(
+            str(
+                statement.compile(
+                    dialect=postgresql.dialect(),
+                    compile_kwargs={"literal_binds": True},
+                )
+            )
+        )
+        return SimpleNamespace(all=lambda: self.rows)
+
+    async def commit(self):
+        pass
+
+    def updates(self):
+        return [s for s in self.statements if s.startswith("UPDATE")]
+
+
+def make_service(monkeypatch, tokens, rows=(), page_size=3):
+    monkeypatch.setattr(uniswap_subgraph, "SUBGRAPH_PAGE_SIZE", page_size)
+    service = UniswapSubgraphService(FakeSession(rows))
+    service.client = FakeClient(tokens)
+    return service
+
+
+def existing(token_id, address, symbol, active):
+    return SimpleNamespace(id=token_id, address=address, symbol=symbol, active=active)
+
+
+async def test_fetch_top_tokens_pages_on_volume_and_dedups_ties(monkeypatch):
+    volumes = [100, 90, 90, 80, 70, 70, 60]
+    tokens = [
+        subgraph_token(f"0x{i}", f"T{i}", volume) for i, volume in enumerate(volumes)
+    ]
+    service = make_service(monkeypatch, tokens)
+
+    top = await service.fetch_top_tokens(10)
+    assert [token["id"] for token in top] == [token["id"] for token in tokens]
+
+    service = make_service(monkeypatch, tokens)
+    top = await service.fetch_top_tokens(5)
+    assert [token["id"] for token in top] == ["0x0", "0x1", "0x2", "0x3", "0x4"]
+
+
+async def test_fetch_top_tokens_stops_when_a_page_is_all_ties(monkeypatch):
+    tokens = [subgraph_token("0xa", "A", 100)] + [
+        subgraph_token(f"0x{i}", f"T{i}", 50) for i in range(5)
+    ]
+    service = make_service(monkeypatch, tokens)
+
+    top = await service.fetch_top_tokens(10)
+    ids = [token["id"] for token in top]
+    # The cursor cannot move past a page tied on one volume
+    assert ids == ["0xa", "0x0", "0x1", "0x2"]
+    assert service.client.queries == 3
+
+
+async def discover(service, top_tokens, pinned_tokens=(), pinned_addresses=()):
+    async def fetch_top_tokens(limit):
+        return list(top_tokens)
+
+    async def fetch_tokens(addresses):
+        return [token for token in pinned_tokens if token["id"] in addresses]
+
+    upserted = []
+
+    async def upsert_tokens(formatted_tokens):
+        upserted.extend(formatted_tokens)
+        return {token["address"]: i + 10 for i, token in enumerate(formatted_tokens)}
+
+    service.fetch_top_tokens = fetch_top_tokens
+    service.fetch_tokens = fetch_tokens
+    service.upsert_tokens = upsert_tokens
+    await service.discover_tokens(len(top_tokens), pinned_addresses)
+    return {token["address"]: token["symbol"] for token in upserted}
+
+
+async def test_discover_tokens_symbol_collisions(monkeypatch):
+    rows = [
+        existing(1, "0xaaaaaaaaaaaaaaaa", "FOO", active=False),
+        existing(2, "0xbbbb", "BAR", active=True),
+    ]
+    service = make_service(monkeypatch, [], rows)
+    upserted = await discover(
+        service,
+        top_tokens=[
+            subgraph_token("0xtop", "DUP", 90),
+            subgraph_token("0xnew", "FOO", 80),
+            subgraph_token("0xcccc", "BAR", 70),
+        ],
+        pinned_tokens=[subgraph_token("0xpinned", "DUP")],
+        pinned_addresses=["0xpinned"],
+    )
+
+    # Pinned tokens win new collisions, tracked tokens keep their symbols
+    assert upserted == {"0xpinned": "DUP", "0xnew": "FOO"}
+    # The retired FOO gives its symbol up
+    assert (
+        "UPDATE tokens SET symbol='0xaaaaaaaa' WHERE tokens.id = 1"
+        in service.db_session.updates()
+    )
+
+
+async def test_discover_tokens_retires_dropped_tokens(monkeypatch):
+    rows = [existing(1, "0xold", "OLD", active=True)]
+    service = make_service(monkeypatch, [], rows)
+    await discover(service, top_tokens=[subgraph_token("0xnew", "NEW", 10)])
+
+    (retire,) = service.db_session.updates()
+    assert "SET active=false" in retire
+    assert "tokens.id NOT IN (10)" in retire
+
+
+async def test_discover_tokens_keeps_tokens_when_nothing_is_discovered(monkeypatch):
+    rows = [existing(1, "0xold", "OLD", active=True)]
+    service = make_service(monkeypatch, [], rows)
+    await discover(service, top_tokens=[])
+
+    assert service.db_session.updates() == []
@@ -56,6 +56,17 @@ async def test_chart_data_has_correct_structure():
     ), "Each category should have 25 data points"
 
 
+async def test_chart_data_by_address_matches_symbol():
+    address = "0x2260fac5e5542a773aa44fbcfedf7c193bc2c599"
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        by_symbol = await ac.get("/api/chart-data/WBTC?hours=24")
+        by_address = await ac.get(f"/api/chart-data/{address}?hours=24")
+    assert by_address.status_code == 200
+    assert by_address.json() == by_symbol.json()
+
+
 async def test_chart_data_has_correct_data():
     token_symbol = "WBTC"
     hours = 24
@@ -119,3 +130,58 @@ async def test_chart_data_has_correct_format():
         assert timestamps == sorted(
             timestamps
         ), "Timestamps are not in chronological order"
+
+
+async def test_chart_data_max_points_bounds_response():
+    token_symbol = "WBTC"
+    hours = 240
+    max_points = 50
+    url = f"/api/chart-data/{token_symbol}?hours={hours}&max_points={max_points}"
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        response = await ac.get(url)
+    respJSON = response.json()
+    assert response.status_code == 200
+    assert len(respJSON) == 5
+    for data_type in respJSON:
+        assert 0 < len(data_type) <= max_points
+        timestamps = [datetime.fromisoformat(point[0]) for point in data_type]
+        assert timestamps == sorted(timestamps)
+
+
+async def test_indicators_bollinger_has_three_bands():
+    url = "/api/indicators/WBTC?indicator=bollinger&hours=48&period=20"
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        response = await ac.get(url)
+    respJSON = response.json()
+    assert response.status_code == 200
+    assert [series[0][1] for series in respJSON] == [
+        "bb_middle",
+        "bb_upper",
+        "bb_lower",
+    ]
+    for middle, upper, lower in zip(*respJSON):
+        assert middle[0] == upper[0] == lower[0]
+        if middle[2] is not None:
+            assert lower[2] <= middle[2] <= upper[2]
+
+
+async def test_correlations_matrix_is_square():
+    url = "/api/correlations?hours=72"
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        response = await ac.get(url)
+    respJSON = response.json()
+    assert response.status_code == 200
+    n = len(respJSON["symbols"])
+    assert n == 3
+    for matrix in ("correlation", "covariance", "observations"):
+        assert len(respJSON[matrix]) == n
+        assert all(len(row) == n for row in respJSON[matrix])
+    for i in range(n):
+        if respJSON["correlation"][i][i] is not None:
+            assert abs(respJSON["correlation"][i][i] - 1.0) < 1e-9
@@ -0,0 +1,92 @@
+import numpy as np
+
+
+"""
+    Downsampling for chart series.
+
+    Both functions take the x (unix time) and y values of one series and
+    return the sorted indices of the points to keep, at most n_out of them.
+    The first and last points are always kept by lttb. Series that already
+    fit are returned whole.
+"""
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets. The inner points are split into
+    n_out - 2 buckets and from each bucket the point forming the largest
+    triangle with the previously kept point and the next bucket's average
+    is kept, which preserves peaks and troughs of the visual shape.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # n_out - 2 buckets spanning the points between the first and the last,
+    # the edges are strictly increasing since n > n_out
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[: n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[: n - 1], edges[:-1]) / counts
+    # The third vertex for a bucket is the next bucket's average,
+    # and the last point for the final bucket
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        # Twice the triangle area, for every candidate in the bucket at once
+        area = np.abs(
+            (ax - next_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[i] - ay)
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def min_max(x, y, n_out):
+    """
+    Keep the minimum and maximum of n_out // 2 equal-count buckets,
+    so every spike survives regardless of its width.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=np.float64)
+    n_buckets = n_out // 2
+    bucket = np.arange(n) * n_buckets // n
+    # Sorted by bucket, then by value, the first and last entry of every
+    # bucket are its minimum and maximum
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(n_buckets))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+
+def fill_gaps(y):
+    """
+    Forward-fill NaN gaps, and backfill leading ones from the first known
+    value, so a series with missing values can still drive point selection.
+    An all-NaN series becomes zeros.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    known = ~np.isnan(y)
+    if not known.any():
+        return np.zeros_like(y)
+    last_known = np.where(known, np.arange(len(y)), 0)
+    np.maximum.accumulate(last_known, out=last_known)
+    filled = y[last_known]
+    filled[: np.argmax(known)] = y[np.argmax(known)]
+    return filled
+
+
+DOWNSAMPLERS = {"lttb": lttb, "minmax": min_max}
@@ -0,0 +1,48 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+
+    The first caller for a key starts fn() as a task, every caller that
+    arrives while it is in flight awaits the same task and gets the same
+    result (or exception). Once it completes the key is released, so later
+    calls run fresh.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.in_flight = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        self.calls += 1
+        task = self.in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done: self.release(key, done))
+        else:
+            self.coalesced += 1
+        # Shielded so one client disconnecting does not cancel the
+        # shared query for everyone else waiting on it
+        return await asyncio.shield(task)
+
+    def release(self, key, task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        # Mark the exception retrieved if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self.in_flight),
+        }
@@ -2,12 +2,18 @@
 -- (if it has not already been created)
 CREATE TABLE IF NOT EXISTS tokens (
     id SERIAL PRIMARY KEY,
-    address VARCHAR(42) NOT NULL UNIQUE,
-    symbol VARCHAR(10) NOT NULL UNIQUE,
+    -- Set by the application, see DEFAULT_CHAIN in api/config.py
+    chain VARCHAR(32) NOT NULL,
+    address VARCHAR(42) NOT NULL,
+    symbol VARCHAR(10) NOT NULL,
     name VARCHAR(80) NOT NULL,
     decimals INTEGER NOT NULL,
     total_supply VARCHAR(80) NOT NULL,
-    volume_usd VARCHAR(80) NOT NULL
+    volume_usd VARCHAR(80) NOT NULL,
+    active BOOLEAN NOT NULL DEFAULT TRUE,
+    -- Addresses and symbols are only unique within a chain
+    CONSTRAINT uix_token_chain_address UNIQUE (chain, address),
+    CONSTRAINT uix_token_chain_symbol UNIQUE (chain, symbol)
 );
 
 -- Create the price_data table to store hourly price information
@@ -25,4 +31,16 @@ CREATE TABLE IF NOT EXISTS price_data (
 
 -- Create an index on token_id and timestamp 
 -- try to optimize the query performance
-CREATE INDEX IF NOT EXISTS idx_price_data_token_timestamp ON price_data (token_id, timestamp);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_price_data_token_timestamp ON price_data (token_id, timestamp);
+
+-- Create the backfill_checkpoints table to record completed backfill windows
+-- (if it has not already been created)
+CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+    id SERIAL PRIMARY KEY,
+    token_id INTEGER NOT NULL REFERENCES tokens(id),
+    window_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    window_end TIMESTAMP WITH TIME ZONE NOT NULL,
+    row_count INTEGER NOT NULL,
+    completed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    CONSTRAINT uix_token_window UNIQUE (token_id, window_start, window_end)
+);